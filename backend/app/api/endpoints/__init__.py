@@ -1,5 +1,6 @@
 from .data import router as data_router
 from .predictions import router as predictions_router
 from .websocket import router as websocket_router
+from .events import router as events_router
 
-__all__ = ["data_router", "predictions_router", "websocket_router"]
\ No newline at end of file
+__all__ = ["data_router", "predictions_router", "websocket_router", "events_router"]
\ No newline at end of file
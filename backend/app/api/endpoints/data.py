@@ -1,26 +1,94 @@
 from fastapi import APIRouter, HTTPException, Query, BackgroundTasks
+from fastapi.responses import StreamingResponse, JSONResponse
 from datetime import datetime, timedelta
 from typing import List, Optional
 import asyncio
+import base64
+import csv
+import io
+import json
+import logging
+import pandas as pd
 
-from app.db.influx_client import query_sensor_data, get_building_stats, write_sensor_data
+from app.db.influx_client import get_write_stats
+from app.db.stats_cache import stats_cache
+from app.db.async_access import (
+    query_sensor_data_async, query_sensor_columns_async, stream_sensor_data_async, get_building_stats_async, write_sensor_data_async,
+    QueryTimeoutError
+)
+from app.db.rollups import rollup_status
+from app.db.downsampling import window_for, lttb, LTTB_OVERSAMPLE
 from app.api.models import SensorDataResponse, BuildingStatsResponse
 from app.simulation.data_generator import data_generator
+from app.api.endpoints import websocket
 
 router = APIRouter()
+logger = logging.getLogger(__name__)
+
+# Toggles received by a worker that doesn't run the simulation, forwarded to the leader
+SIMULATION_CHANNEL = "simulation"
 
 @router.get("/sensor", response_model=SensorDataResponse)
 async def get_sensor_data(
     building_id: Optional[str] = Query(None, description="Filter by building ID"),
     data_type: Optional[str] = Query(None, description="Filter by data type"),
     hours: int = Query(24, description="Hours of data to retrieve", ge=1, le=720),
-    limit: int = Query(1000, description="Maximum data points", ge=1, le=10000)
+    limit: int = Query(1000, description="Maximum data points", ge=1, le=10000),
+    stream: Optional[str] = Query(None, description="Stream rows as they arrive: ndjson or csv (shape=rows only, no LTTB)", pattern="^(ndjson|csv)$"),
+    shape: str = Query("rows", description="rows: one object per point; columnar: parallel arrays per series", pattern="^(rows|columnar)$"),
+    encoding: str = Query("json", description="Columnar array encoding: json lists or base64 float32 values", pattern="^(json|float32)$"),
+    max_points: Optional[int] = Query(None, description="Downsample each series to about this many points", ge=3, le=10000),
+    downsample: str = Query("mean", description="mean: aggregateWindow only; lttb: also keep visual peaks with LTTB", pattern="^(mean|lttb)$")
 ):
     """
     Retrieve sensor data from InfluxDB
     """
+    # With max_points the window is chosen so InfluxDB returns at most that many points per series
+    every = window_for(hours, max_points) if max_points else None
+    use_lttb = bool(max_points) and downsample == "lttb"
+
+    if use_lttb and stream:
+        raise HTTPException(status_code=400, detail="LTTB downsampling is not available for streamed responses")
+    if shape == "columnar" and stream:
+        raise HTTPException(status_code=400, detail="Columnar responses cannot be streamed; use shape=rows")
+
+    if shape == "columnar" or use_lttb:
+        try:
+            if use_lttb:
+                # Fetch a finer aggregate and let LTTB pick the visually significant points
+                fine_points = max_points * LTTB_OVERSAMPLE
+                series = await query_sensor_columns_async(
+                    building_id, data_type, hours, fine_points, window_for(hours, fine_points)
+                )
+                threshold = min(max_points, limit)
+                for s in series:
+                    s["times"], s["values"] = lttb(s["times"], s["values"], threshold)
+            else:
+                series = await query_sensor_columns_async(building_id, data_type, hours, limit, every)
+        except QueryTimeoutError as e:
+            raise HTTPException(status_code=504, detail=str(e))
+
+        if shape == "columnar":
+            return JSONResponse(_columnar_payload(series, hours, encoding))
+        data = _series_to_rows(series)
+        end_time = datetime.utcnow()
+        return SensorDataResponse(
+            data=data,
+            count=len(data),
+            time_range={
+                "start": (end_time - timedelta(hours=hours)).isoformat(),
+                "end": end_time.isoformat()
+            }
+        )
+
+    if stream:
+        rows = stream_sensor_data_async(building_id, data_type, hours, limit, every)
+        if stream == "csv":
+            return StreamingResponse(_csv_lines(rows), media_type="text/csv")
+        return StreamingResponse(_ndjson_lines(rows), media_type="application/x-ndjson")
+
     try:
-        data = query_sensor_data(building_id, data_type, hours, limit)
+        data = await query_sensor_data_async(building_id, data_type, hours, limit, every)
         
         # Calculate time range
         end_time = datetime.utcnow()
@@ -34,9 +102,78 @@ async def get_sensor_data(
                 "end": end_time.isoformat()
             }
         )
+    except QueryTimeoutError as e:
+        raise HTTPException(status_code=504, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error retrieving data: {str(e)}")
 
+def _columnar_payload(series, hours: int, encoding: str):
+    """Group points by series with parallel `times` (epoch ms) and `values` arrays.
+
+    With encoding=float32 the arrays are sent as base64 little-endian buffers
+    (int64 times, float32 values) that clients can wrap in typed arrays directly.
+    """
+    end_time = datetime.utcnow()
+    start_time = end_time - timedelta(hours=hours)
+
+    encoded = []
+    for s in series:
+        if encoding == "float32":
+            times = base64.b64encode(s["times"].astype("<i8").tobytes()).decode("ascii")
+            values = base64.b64encode(s["values"].astype("<f4").tobytes()).decode("ascii")
+        else:
+            times = s["times"].tolist()
+            values = s["values"].tolist()
+        encoded.append({"building": s["building"], "type": s["type"], "times": times, "values": values})
+
+    return {
+        "series": encoded,
+        "count": sum(len(s["values"]) for s in series),
+        "encoding": encoding,
+        "time_range": {
+            "start": start_time.isoformat(),
+            "end": end_time.isoformat()
+        }
+    }
+
+def _series_to_rows(series):
+    rows = []
+    for s in series:
+        times = pd.to_datetime(s["times"], unit="ms", utc=True)
+        rows.extend(
+            {"building": s["building"], "type": s["type"], "value": value, "time": time.isoformat()}
+            for time, value in zip(times, s["values"].tolist())
+        )
+    return rows
+
+SENSOR_COLUMNS = ["building", "type", "value", "time"]
+
+async def _ndjson_lines(chunks):
+    try:
+        async for rows in chunks:
+            yield "".join(json.dumps(row) + "\n" for row in rows)
+    except Exception as e:
+        # Headers are already sent, so the error can only be reported in-band
+        if not isinstance(e, QueryTimeoutError):
+            logger.exception("Sensor stream failed")
+        yield json.dumps({"error": str(e)}) + "\n"
+
+async def _csv_lines(chunks):
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=SENSOR_COLUMNS)
+    writer.writeheader()
+    yield buffer.getvalue()
+    try:
+        async for rows in chunks:
+            buffer.seek(0)
+            buffer.truncate()
+            writer.writerows(rows)
+            yield buffer.getvalue()
+    except Exception as e:
+        if not isinstance(e, QueryTimeoutError):
+            logger.exception("Sensor stream failed")
+        yield f"# error: {e}\n"
+
 @router.get("/stats", response_model=BuildingStatsResponse)
 async def get_building_statistics(
     hours: int = Query(720, description="Hours of data to retrieve", ge=1, le=720)
@@ -46,7 +183,7 @@ async def get_building_statistics(
     """
     try:
         # Pass the hours variable to the function
-        stats = get_building_stats(hours) 
+        stats = await get_building_stats_async(hours)
         buildings_list = list(stats.values())
         
         # Calculate campus average score
@@ -58,9 +195,21 @@ async def get_building_statistics(
             timestamp=datetime.utcnow(),
             campus_avg_score=round(campus_avg, 2)
         )
+    except QueryTimeoutError as e:
+        raise HTTPException(status_code=504, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error getting statistics: {str(e)}")
 
+@router.get("/stats/cache")
+def get_stats_cache_status():
+    """Hit/miss counters of the shared building stats cache"""
+    return stats_cache.stats()
+
+@router.get("/rollups")
+def get_rollup_status():
+    """Progress and retention of the hourly/daily rollup buckets"""
+    return rollup_status()
+
 @router.get("/simulation/status")
 def get_simulation_status():
     """Check if the automated data stream is currently running"""
@@ -69,9 +218,7 @@ def get_simulation_status():
         "buildings_tracked": len(data_generator.buildings)
     }
 
-@router.post("/simulation/toggle")
-def toggle_simulation():
-    """Pause or Resume the automated data generation"""
+def toggle_local_simulation():
     if data_generator.is_running:
         data_generator.stop_simulation()
         return {"status": "paused", "message": "Simulation stopped."}
@@ -80,6 +227,28 @@ def toggle_simulation():
         asyncio.create_task(data_generator.start_continuous_simulation(interval_seconds=300))
         return {"status": "running", "message": "Simulation resumed."}
 
+async def on_simulation_toggle(message):
+    if websocket.is_leader():
+        toggle_local_simulation()
+
+websocket.channel_handlers[SIMULATION_CHANNEL] = on_simulation_toggle
+
+@router.post("/simulation/toggle")
+async def toggle_simulation():
+    """Pause or Resume the automated data generation.
+
+    Only the leader runs the simulation; other workers forward the toggle to it.
+    """
+    if websocket.is_leader():
+        return toggle_local_simulation()
+    await websocket.fanout.publish(SIMULATION_CHANNEL, {"action": "toggle"})
+    return JSONResponse(status_code=202, content={"status": "forwarded", "message": "Toggle sent to the simulation leader."})
+
+@router.get("/write-stats")
+def get_write_pipeline_stats():
+    """Batch latency and dropped/retried point counters of the buffered write pipeline"""
+    return get_write_stats()
+
 @router.get("/buildings")
 async def get_buildings_list():
     """
@@ -107,7 +276,7 @@ async def add_manual_data(
     Add manual sensor data (for testing)
     """
     try:
-        success = write_sensor_data(building_id, data_type, value)
+        success = await write_sensor_data_async(building_id, data_type, value)
         
         if success:
             return {"message": "Data added successfully", "building_id": building_id}
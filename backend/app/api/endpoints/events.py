@@ -0,0 +1,74 @@
+from fastapi import APIRouter, Header, Query
+from fastapi.responses import StreamingResponse
+from typing import Optional
+import asyncio
+
+from app.core.config import settings
+from app.api.endpoints.websocket import deltas, event_log, snapshot_event, sync_from_snapshot
+from app.realtime.sse import SNAPSHOT, format_event, format_event_id, parse_event_id
+
+router = APIRouter()
+
+@router.get("/stream")
+async def stream_events(
+    last_event_id: Optional[str] = Header(None),
+    resume_from: Optional[str] = Query(None, description="Last event id seen, for clients that cannot set Last-Event-ID")
+):
+    """
+    Server-Sent Events stream of campus stats and anomalies for read-only dashboards.
+
+    Streams the same sequenced deltas as the WebSocket endpoint ("delta" events, id =
+    epoch:seq) and "anomaly" events (id = epoch:seq.n). A client reconnecting with
+    Last-Event-ID gets the events it missed; when those are no longer buffered, or the id
+    is from another epoch, it gets a "snapshot" first. A "snapshot" can also arrive
+    mid-stream when this worker resyncs; it replaces the client's state.
+    """
+    resume = parse_event_id(last_event_id or resume_from or "")
+    return StreamingResponse(
+        _event_stream(resume),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "Connection": "keep-alive",
+            # Stop nginx from buffering the stream
+            "X-Accel-Buffering": "no",
+        },
+    )
+
+async def _event_stream(resume):
+    # Subscribe before reading the buffer so nothing falls between replay and live events
+    subscriber = event_log.subscribe()
+    try:
+        yield f"retry: {settings.SSE_RETRY_MS}\n\n"
+
+        if deltas.seq == 0:
+            await sync_from_snapshot()
+
+        # Ids from another epoch (e.g. before a restart) or past our newest event are unknown
+        replay = event_log.since(*resume) if resume else None
+        if replay is None:
+            seq, state = deltas.snapshot()
+            last = (seq, 0)
+            yield format_event(format_event_id(event_log.epoch, last), SNAPSHOT, snapshot_event(seq, state))
+            replay = event_log.since(event_log.epoch, last) or []
+        else:
+            last = resume[1]
+
+        for key, frame in replay:
+            yield frame
+            last = key
+
+        while not subscriber.overflowed:
+            try:
+                key, frame, event_type = await asyncio.wait_for(subscriber.queue.get(), settings.SSE_HEARTBEAT_SECONDS)
+            except asyncio.TimeoutError:
+                yield ": keep-alive\n\n"
+                continue
+            # A snapshot restarts the position, which may move backwards in a new epoch
+            if key <= last and event_type != SNAPSHOT:
+                continue
+            yield frame
+            last = key
+        # Fell too far behind: end the stream, the browser reconnects with Last-Event-ID
+    finally:
+        event_log.unsubscribe(subscriber)
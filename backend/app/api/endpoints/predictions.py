@@ -1,61 +1,256 @@
-from fastapi import APIRouter, BackgroundTasks
+from fastapi import APIRouter
 from pydantic import BaseModel
 from typing import List, Optional, Dict, Any
 from datetime import datetime, timedelta
 import numpy as np
 import pandas as pd
-import joblib
+import asyncio
 import math
 import random
-from app.api.models import PredictionRequest, PredictionResponse
+import uuid
+from app.api.models import PredictionRequest, PredictionResponse, BatchPredictionRequest
 from app.ml.models import model_manager
 from app.ml.data_processor import DataProcessor
+from app.ml.forecast_cache import ForecastCache
+from app.ml.model_store import ModelStore
+from app.ml.model_registry import ModelRegistry, ModelSet
+from app.ml.retrain_worker import FAILED, RUNNING, RetrainManager, describe
+from app.core.config import settings
 from fastapi import HTTPException
+from fastapi.responses import JSONResponse
+from app.api.endpoints import websocket
 from apscheduler.schedulers.background import BackgroundScheduler
-from scripts.train_ml import run_training_pipeline
 
 router = APIRouter()
 
 # --- DYNAMICALLY LOAD ALL MODELS ---
-forecast_models = {}
-anomaly_models = {}
-maintenance_model = None
+# Model files under ML_MODEL_PATH, per data type
+FORECAST_MODEL_NAMES = {'energy': 'energy_predictor', 'water': 'water_predictor', 'occupancy': 'occupancy_predictor'}
+ANOMALY_MODEL_NAMES = {'energy': 'energy_anomaly_model', 'water': 'water_anomaly_model', 'occupancy': 'occupancy_anomaly_model'}
+MAINTENANCE_MODEL_NAME = 'maintenance_classifier_model'
+
+model_store = ModelStore(settings.ML_MODEL_PATH, compile=settings.ML_COMPILE_MODELS)
+# Serves one versioned set of all models at a time; the initial set loads lazily on first use
+registry = ModelRegistry(
+    model_store,
+    [*FORECAST_MODEL_NAMES.values(), *ANOMALY_MODEL_NAMES.values(), MAINTENANCE_MODEL_NAME],
+    history=settings.MODEL_REGISTRY_HISTORY,
+)
+forecast_cache = ForecastCache(max_entries=settings.FORECAST_CACHE_SIZE)
+
+def prepare_model_set(models: ModelSet):
+    """Warm a set off the request path: load and exercise every model, then fill its forecast cache.
+
+    Runs before the set is published, so no request after a swap pays a cold model load.
+    """
+    if models.warmed_at is None:
+        models.warm()
+    warm_forecast_cache(models)
 
-def load_all_models():
-    """Loads or reloads ML models into memory without restarting the server."""
-    global forecast_models, anomaly_models, maintenance_model
-    try:
-        print(f"[{datetime.now()}] Loading ML Models into memory...")
-        forecast_models['energy'] = joblib.load("models/energy_predictor.pkl")
-        forecast_models['water'] = joblib.load("models/water_predictor.pkl")
-        forecast_models['occupancy'] = joblib.load("models/occupancy_predictor.pkl")
+def load_all_models() -> ModelSet:
+    """Loads or reloads ML models without restarting the server.
+
+    The new set is loaded and warmed while the current one keeps serving, then swapped
+    in at once; the previous sets stay available for rollback.
+    """
+    print(f"[{datetime.now()}] Loading ML Models into a new model set...")
+    models = registry.build()
+    missing = [name for name in models.fingerprints if not models.available(name)]
+    if missing:
+        print(f"WARNING: Models not found: {missing}")
+    registry.publish(models, prepare=prepare_model_set)
+    print(f"Model set v{models.version} is now serving ({models.warm_seconds}s warm-up).")
+    return models
+
+def warm_initial_models():
+    """Warm the startup set in the background; requests before that load models on demand"""
+    prepare_model_set(registry.current)
+
+# Visual baseline for the charts and display units per forecast type
+FORECAST_BASELINES = {'energy': 150, 'water': 300, 'occupancy': 50}
+FORECAST_UNITS = {'energy': 'kWh', 'water': 'L', 'occupancy': 'ppl'}
+# Hour offset of the injected test peak (14:00 when requested at midnight)
+ANOMALY_PEAK_INDEX = 13
+
+def forecast_features(now: datetime, hours_ahead: int) -> pd.DataFrame:
+    """Simulated future environment (hour, weekday, temperature) for the next `hours_ahead` hours"""
+    future_times = [now + timedelta(hours=i + 1) for i in range(hours_ahead)]
+    hours = np.array([t.hour for t in future_times])
+    return pd.DataFrame({
+        'hour': hours,
+        'day_of_week': [t.weekday() for t in future_times],
+        # Weather simulation
+        'temperature': 15 + 10 * np.sin((hours - 8) * (math.pi / 12)),
+    })
+
+def forecast_values(data_type: str, features: pd.DataFrame, include_anomaly: bool = False, models: ModelSet = None) -> np.ndarray:
+    """Floored forecast for each feature row, from the model or the fallback curve if it isn't loaded"""
+    model = (models or registry.current).get(FORECAST_MODEL_NAMES.get(data_type))
+    if model:
+        # --- REAL ML PREDICTION ---
+        values = np.floor(model.predict(features))
+    else:
+        # Fallback math if model isn't loaded
+        base = FORECAST_BASELINES.get(data_type, 150)
+        steps = np.arange(len(features))
+        values = np.floor(base + np.random.uniform(0, 50, len(features)) * np.sin(steps / 3))
+
+    # Inject anomaly peak for testing UI if requested
+    if include_anomaly and len(values) > ANOMALY_PEAK_INDEX:
+        values[ANOMALY_PEAK_INDEX] = math.floor(values[ANOMALY_PEAK_INDEX] * 2.5)
+    return values.astype(int)
 
-        anomaly_models['energy'] = joblib.load("models/energy_anomaly_model.pkl")
-        anomaly_models['water'] = joblib.load("models/water_anomaly_model.pkl")
-        anomaly_models['occupancy'] = joblib.load("models/occupancy_anomaly_model.pkl")
+def forecast_key(data_type: str, hours_ahead: int, include_anomaly: bool, hour_bucket: datetime, version: int):
+    return (data_type, hours_ahead, include_anomaly, hour_bucket, version)
 
-        maintenance_model = joblib.load("models/maintenance_classifier_model.pkl")
-        print("All ML Models successfully loaded and ready for inference.")
-    except FileNotFoundError as e:
-        print(f"WARNING: Models not found. {e}")
+def cached_forecast(data_type: str, hours_ahead: int, include_anomaly: bool = False, now: datetime = None, models: ModelSet = None) -> Dict[str, Any]:
+    """Forecast for the current hour, computed once per hour bucket and model set version.
 
-# Initial load on startup
-load_all_models()
+    Features are derived from the start of the hour, which yields the same hours and
+    weekdays as any moment within it, so one entry serves the whole hour.
+    """
+    models = models or registry.current
+    hour_bucket = (now or datetime.now()).replace(minute=0, second=0, microsecond=0)
+    key = forecast_key(data_type, hours_ahead, include_anomaly, hour_bucket, models.version)
+    forecast = forecast_cache.get(key)
+    if forecast is not None:
+        return forecast
+
+    base = FORECAST_BASELINES.get(data_type, 150)
+    values = forecast_values(data_type, forecast_features(hour_bucket, hours_ahead), include_anomaly, models)
+
+    chart_data = []
+    peak_val = 0
+    peak_time = ""
+    for i, val in enumerate(values.tolist()):
+        time_str = f"{(hour_bucket + timedelta(hours=i+1)).strftime('%H:00')}"
+        if val > peak_val:
+            peak_val = val
+            peak_time = time_str
+        chart_data.append({"time": time_str, "predicted": val, "baseline": base})
+
+    # Format the units based on data type
+    unit = FORECAST_UNITS.get(data_type, '')
+
+    forecast = {
+        "values": values,
+        "chart_data": chart_data,
+        "peak_forecast": {
+            "time": peak_time,
+            "value": f"{peak_val} {unit}",
+            "reason": "AI Predicted Peak based on Temp & Schedule",
+            "icon_type": data_type
+        }
+    }
+    forecast_cache.put(key, forecast)
+    return forecast
+
+def warm_forecast_cache(models: ModelSet = None):
+    """Precompute the common horizons for the current hour and drop entries of past hours or models.
+
+    Only models already in use are warmed, so this never forces a model into memory.
+    """
+    models = models or registry.current
+    now = datetime.now()
+    hour_bucket = now.replace(minute=0, second=0, microsecond=0)
+    # Keep the serving set's entries while a new set is being prepared
+    versions = {registry.current.version, models.version}
+    forecast_cache.prune(lambda key: key[3] >= hour_bucket and key[4] in versions)
+    for data_type, name in FORECAST_MODEL_NAMES.items():
+        if not models.is_loaded(name):
+            continue
+        for hours_ahead in settings.FORECAST_CACHE_HORIZONS:
+            for include_anomaly in (False, True):
+                cached_forecast(data_type, hours_ahead, include_anomaly, now, models)
+
+
+# --- OUT-OF-PROCESS RETRAINING ---
+# Tells the other API workers that new models were installed in the shared model directory
+MODELS_CHANNEL = "models"
+WORKER_ID = uuid.uuid4().hex
+
+def install_trained_models() -> ModelSet:
+    """Publish freshly trained models here and have every other worker reload them too"""
+    models = load_all_models()
+    websocket.publish_from_thread(MODELS_CHANNEL, {"origin": WORKER_ID, "version": models.version})
+    return models
+
+async def on_models_updated(message: Dict[str, Any]):
+    if message.get("origin") == WORKER_ID:
+        return
+    await asyncio.to_thread(load_all_models)
+
+websocket.channel_handlers[MODELS_CHANNEL] = on_models_updated
+
+# Only the leader runs training jobs; other workers forward start/cancel requests to it
+# and read the job's status from the shared store
+RETRAIN_CHANNEL = "retrain"
+RETRAIN_STATUS_KEY = "retrain_job"
+
+def share_retrain_status(job: Dict[str, Any]):
+    websocket.store_from_thread(RETRAIN_STATUS_KEY, job)
+
+# Training runs in its own limited process; finished models are published as a new set
+retrain_manager = RetrainManager(
+    settings.ML_MODEL_PATH,
+    limits={
+        "memory_mb": settings.RETRAIN_MAX_MEMORY_MB,
+        "cpu_seconds": settings.RETRAIN_MAX_CPU_SECONDS,
+        "cpus": settings.RETRAIN_CPUS,
+        "nice": settings.RETRAIN_NICE,
+    },
+    on_complete=install_trained_models,
+    on_change=share_retrain_status,
+)
+
+async def on_retrain_command(message: Dict[str, Any]):
+    if not websocket.is_leader():
+        return
+    if message.get("action") == "start":
+        try:
+            await asyncio.to_thread(retrain_manager.start, "manual")
+        except RuntimeError as e:
+            print(f"Skipping forwarded retraining: {e}")
+    elif message.get("action") == "cancel":
+        await asyncio.to_thread(retrain_manager.cancel)
+
+websocket.channel_handlers[RETRAIN_CHANNEL] = on_retrain_command
+
+async def current_retrain_job() -> Optional[Dict[str, Any]]:
+    """The leader's current or last job, as seen from this worker"""
+    if websocket.is_leader() and retrain_manager.job is not None:
+        return retrain_manager.status()
+    return describe(await websocket.fanout.load(RETRAIN_STATUS_KEY))
+
+async def close_orphaned_retrain_job():
+    """On election: a job still shared as running belonged to a previous leader that is gone"""
+    try:
+        job = await websocket.fanout.load(RETRAIN_STATUS_KEY)
+        if job and job["state"] == RUNNING and not retrain_manager.running():
+            job.update(state=FAILED, error="The worker running this job stopped", finished_at=datetime.now().isoformat())
+            await websocket.fanout.store(RETRAIN_STATUS_KEY, job)
+    except Exception as e:
+        print(f"Could not check the shared retrain job: {e}")
 
 # --- AUTOMATED SCHEDULER SETUP ---
+# Paused until this worker is elected leader, so only one worker trains on schedule
+RETRAIN_JOB_ID = "scheduled_retrain"
+
 def scheduled_retrain_job():
     """The function executed by the cron scheduler."""
     try:
-        success = run_training_pipeline()
-        if success:
-            load_all_models() # Immediately apply new models to live traffic
-    except Exception as e:
-        print(f"CRITICAL: Scheduled retraining failed: {e}")
+        retrain_manager.start(trigger="schedule")
+    except RuntimeError as e:
+        print(f"Skipping scheduled retraining: {e}")
 
 # Start the background scheduler
 scheduler = BackgroundScheduler()
 # Example 1: Run every Sunday at 2:00 AM
-scheduler.add_job(scheduled_retrain_job, 'cron', day_of_week='sun', hour=2, minute=0)
+scheduler.add_job(scheduled_retrain_job, 'cron', day_of_week='sun', hour=2, minute=0, id=RETRAIN_JOB_ID, next_run_time=None)
+# Recompute forecasts as soon as the hour rolls over
+scheduler.add_job(warm_forecast_cache, 'cron', minute=0, second=1)
+# Warm the startup models once, right away
+scheduler.add_job(warm_initial_models)
 
 scheduler.start()
 
@@ -63,15 +258,16 @@ scheduler.start()
 @router.get("/model-status")
 def get_model_status():
     """Returns the live status, types, and metrics of all loaded ML models."""
+    models = registry.current
     
     # Check if specific models were successfully loaded into memory
-    energy_trained = forecast_models.get('energy') is not None
-    water_trained = forecast_models.get('water') is not None
-    occupancy_trained = forecast_models.get('occupancy') is not None
+    energy_trained = models.available(FORECAST_MODEL_NAMES['energy'])
+    water_trained = models.available(FORECAST_MODEL_NAMES['water'])
+    occupancy_trained = models.available(FORECAST_MODEL_NAMES['occupancy'])
     
     # Check if anomaly and maintenance models are loaded
-    anomalies_trained = anomaly_models.get('energy') is not None
-    maint_trained = maintenance_model is not None
+    anomalies_trained = models.available(ANOMALY_MODEL_NAMES['energy'])
+    maint_trained = models.available(MAINTENANCE_MODEL_NAME)
 
     return {
         "models": {
@@ -110,8 +306,11 @@ def get_model_status():
                 "accuracy": 0.89 if maint_trained else 0.0
             }
         },
+        "model_version": models.version,
+        "model_registry": registry.stats(),
+        "forecast_cache": forecast_cache.stats(),
         "last_updated": datetime.now().isoformat(),
-        "models_directory": "models/"
+        "models_directory": settings.ML_MODEL_PATH
     }
 
 @router.post("/what-if")
@@ -125,7 +324,7 @@ async def what_if_analysis(
     """
     try:
         # Get current consumption
-        current_energy = DataProcessor.get_historical_series(building_id, "energy", 24)
+        current_energy = await DataProcessor.get_historical_series_async(building_id, "energy", 24)
         avg_energy = np.mean(current_energy) if current_energy else 100
         
         # Initialize results
@@ -189,7 +388,7 @@ async def what_if_analysis(
             recycling_rate = parameters.get("recycling_rate", 50) / 100
             
             # Get current water usage
-            current_water = DataProcessor.get_historical_series(building_id, "water", 24)
+            current_water = await DataProcessor.get_historical_series_async(building_id, "water", 24)
             avg_water = np.mean(current_water) if current_water else 300
             
             water_savings = avg_water * recycling_rate * 0.8  # 80% efficiency
@@ -212,86 +411,56 @@ async def what_if_analysis(
 @router.post("/predict")
 def make_prediction(request: PredictionRequest):
     """Uses Random Forest models to forecast the next 24 hours."""
-    
-    model = forecast_models.get(request.data_type)
-    
-    # Establish a visual baseline for the charts
-    base_map = {'energy': 150, 'water': 300, 'occupancy': 50}
-    base = base_map.get(request.data_type, 150)
-
-    now = datetime.now()
-    future_features = []
-    
-    # Generate the simulated future environment data
-    for i in range(request.hours_ahead):
-        future_time = now + timedelta(hours=i+1)
-        # Weather simulation
-        simulated_temp = 15 + 10 * math.sin((future_time.hour - 8) * (math.pi / 12))
-        
-        future_features.append({
-            'hour': future_time.hour,
-            'day_of_week': future_time.weekday(),
-            'temperature': simulated_temp
-        })
-    
-    chart_data = []
-    peak_val = 0
-    peak_time = ""
-
-    if model:
-        # --- REAL ML PREDICTION ---
-        df_future = pd.DataFrame(future_features)
-        predictions = model.predict(df_future)
-        
-        for i, pred in enumerate(predictions):
-            time_str = f"{(now + timedelta(hours=i+1)).strftime('%H:00')}"
-            val = math.floor(pred)
-            
-            # Inject anomaly peak for testing UI if requested
-            if request.include_anomaly and i == 13: # 14:00 peak
-                val = math.floor(val * 2.5)
+    forecast = cached_forecast(request.data_type, request.hours_ahead, request.include_anomaly)
+    return {
+        "building_id": request.building_id,
+        "data_type": request.data_type,
+        "chart_data": forecast["chart_data"],
+        "peak_forecast": forecast["peak_forecast"]
+    }
 
-            if val > peak_val:
-                peak_val = val
-                peak_time = time_str
+@router.post("/predict/batch")
+def make_batch_prediction(request: BatchPredictionRequest):
+    """
+    Forecast every requested building x data type over the horizon in one call.
 
-            chart_data.append({"time": time_str, "predicted": val, "baseline": base})
-    else:
-        # Fallback math if model isn't loaded
-        for i in range(request.hours_ahead):
-            time_str = f"{(now + timedelta(hours=i+1)).strftime('%H:00')}"
-            val = math.floor(base + random.uniform(0, 50) * math.sin(i / 3))
-            
-            if request.include_anomaly and i == 13:
-                val = math.floor(val * 2.5)
-                
-            if val > peak_val:
-                peak_val = val
-                peak_time = time_str
-                
-            chart_data.append({"time": time_str, "predicted": val, "baseline": base})
+    The forecast features (hour, weekday, simulated temperature) are the same for every
+    building, so each model runs a single predict over one shared feature matrix and the
+    series is reported once per data type for all requested buildings. Output is columnar.
+    """
+    unknown = [t for t in request.data_types if t not in FORECAST_BASELINES]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unsupported data types: {unknown}")
 
-    # Format the units based on data type
-    units = {'energy': 'kWh', 'water': 'L', 'occupancy': 'ppl'}
-    unit = units.get(request.data_type, '')
+    now = datetime.now()
+    models = registry.current
+
+    series = {}
+    for data_type in dict.fromkeys(request.data_types):
+        values = cached_forecast(data_type, request.hours_ahead, request.include_anomaly, now, models)["values"]
+        peak = int(np.argmax(values))
+        series[data_type] = {
+            "predicted": values.tolist(),
+            "baseline": FORECAST_BASELINES[data_type],
+            "unit": FORECAST_UNITS[data_type],
+            "peak": {"index": peak, "value": int(values[peak])},
+            "model": models.available(FORECAST_MODEL_NAMES[data_type]),
+        }
 
     return {
-        "building_id": request.building_id,
-        "data_type": request.data_type,
-        "chart_data": chart_data,
-        "peak_forecast": {
-            "time": peak_time,
-            "value": f"{peak_val} {unit}",
-            "reason": "AI Predicted Peak based on Temp & Schedule",
-            "icon_type": request.data_type
-        }
+        "buildings": request.building_ids,
+        "shared_across_buildings": True,
+        "hours_ahead": request.hours_ahead,
+        "times": [(now + timedelta(hours=i + 1)).strftime('%Y-%m-%dT%H:00') for i in range(request.hours_ahead)],
+        "series": series,
+        "model_version": models.version,
+        "generated_at": now.isoformat(),
     }
 
-
 @router.get("/maintenance")
 def get_predictive_maintenance(building_id: str):
     """Uses Random Forest Classifier to predict equipment failure"""
-    
+    maintenance_model = registry.current.get(MAINTENANCE_MODEL_NAME)
     if not maintenance_model:
         return {"alerts": [{
             "id": 1, "equipment": "System Offline", "health": 0, "eta": "N/A", "issue": "Run train_models.py", "status": "critical"
@@ -305,19 +474,21 @@ def get_predictive_maintenance(building_id: str):
     ]
     
     alerts = []
-    
-    for eq in equipment_list:
-        # Format for sklearn
-        X_test = pd.DataFrame([{
-            'age_days': eq['age_days'], 
-            'vibration_mm_s': eq['vibration_mm_s'], 
-            'motor_temp_c': eq['motor_temp_c']
-        }])
-        
-        # --- REAL ML CLASSIFICATION ---
-        # Returns 0 (Good), 1 (Warning), 2 (Critical)
-        prediction = int(maintenance_model.predict(X_test)[0])
-        
+
+    # One row per piece of equipment, classified in a single call
+    X_test = pd.DataFrame([{
+        'age_days': eq['age_days'],
+        'vibration_mm_s': eq['vibration_mm_s'],
+        'motor_temp_c': eq['motor_temp_c']
+    } for eq in equipment_list])
+
+    # --- REAL ML CLASSIFICATION ---
+    # Returns 0 (Good), 1 (Warning), 2 (Critical)
+    predictions = maintenance_model.predict(X_test)
+
+    for eq, prediction in zip(equipment_list, predictions.tolist()):
+        prediction = int(prediction)
+
         if prediction > 0:
             status = "critical" if prediction == 2 else "warning"
             
@@ -346,7 +517,7 @@ def get_predictive_maintenance(building_id: str):
 def get_anomalies(building_id: str, data_type: str = 'energy', current_usage: float = None):
     """Uses Isolation Forest to detect if current usage is an anomaly"""
     
-    model = anomaly_models.get(data_type)
+    model = registry.current.get(ANOMALY_MODEL_NAMES.get(data_type))
 
     if not model:
         return {"anomalies": []}
@@ -387,12 +558,47 @@ def get_anomalies(building_id: str, data_type: str = 'energy', current_usage: fl
     return {"anomalies": anomalies}
 
 @router.post("/retrain")
-def trigger_manual_retrain(background_tasks: BackgroundTasks):
+async def trigger_manual_retrain():
     """Allows admins to manually trigger a model retrain from the React dashboard."""
-    def background_job():
-        if run_training_pipeline():
-            load_all_models()
+    if not websocket.is_leader():
+        job = await current_retrain_job()
+        if job and job["state"] == RUNNING:
+            raise HTTPException(status_code=409, detail=f"Retrain job {job['id']} is already running")
+        await websocket.fanout.publish(RETRAIN_CHANNEL, {"action": "start"})
+        return JSONResponse(status_code=202, content={"message": "Retraining request sent to the leader worker.", "job": job})
+    try:
+        job = await asyncio.to_thread(retrain_manager.start, "manual")
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return {
+        "message": "Retraining started in a separate worker process. Models will hot-reload upon completion.",
+        "job": job,
+    }
 
-    # Adds the task to a background queue so the API returns instantly
-    background_tasks.add_task(background_job)
-    return {"message": "Retraining pipeline initiated in the background. Models will hot-reload upon completion."}
\ No newline at end of file
+@router.get("/retrain/status")
+async def get_retrain_status():
+    """Progress of the current or last retraining job."""
+    return {"job": await current_retrain_job()}
+
+@router.post("/retrain/cancel")
+async def cancel_retrain():
+    """Stops the running retraining job; the serving models are left untouched."""
+    if not websocket.is_leader():
+        job = await current_retrain_job()
+        if job is None or job["state"] != RUNNING:
+            raise HTTPException(status_code=409, detail="No retraining job is running")
+        await websocket.fanout.publish(RETRAIN_CHANNEL, {"action": "cancel"})
+        return JSONResponse(status_code=202, content={"message": "Cancellation sent to the leader worker.", "job": job})
+    job = await asyncio.to_thread(retrain_manager.cancel)
+    if job is None:
+        raise HTTPException(status_code=409, detail="No retraining job is running")
+    return {"message": "Retraining cancelled.", "job": job}
+
+@router.post("/models/rollback")
+def rollback_models(version: Optional[int] = None):
+    """Serve a previous model set again (the latest one unless `version` is given)."""
+    try:
+        models = registry.rollback(version, prepare=prepare_model_set)
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"Model set {version} is not retained; available: {registry.versions()[1:]}")
+    return {"message": f"Model set v{models.version} is now serving.", "model_version": models.version}
@@ -1,65 +1,81 @@
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect
-from typing import List, Dict, Any
+from typing import Awaitable, Callable, List, Dict, Any
 import asyncio
-import json
+import logging
 from datetime import datetime
-import random
 
-from app.api.models import WebSocketMessage
-from app.db.influx_client import get_building_stats
+from app.core.config import settings
+from app.realtime import codec
+from app.realtime.broadcaster import ConnectionManager
+from app.realtime.topics import METRIC_FIELDS, TopicRegistry, filter_stats
+from app.realtime.deltas import DeltaTracker
+from app.realtime.event_bus import event_bus, READINGS, ANOMALIES, CAMPUS_READINGS
+from app.realtime.fanout import create_fanout
+from app.realtime.live_state import LiveState
+from app.realtime.sse import EventLog, DELTA, parse_event_id
+from app.db.async_access import get_building_stats_async, QueryTimeoutError
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
-class ConnectionManager:
-    def __init__(self):
-        self.active_connections: List[WebSocket] = []
-    
-    async def connect(self, websocket: WebSocket):
-        await websocket.accept()
-        self.active_connections.append(websocket)
-        print(f"New WebSocket connection. Total: {len(self.active_connections)}")
-    
-    def disconnect(self, websocket: WebSocket):
-        self.active_connections.remove(websocket)
-        print(f"WebSocket disconnected. Total: {len(self.active_connections)}")
-    
-    async def send_personal_message(self, message: str, websocket: WebSocket):
-        await websocket.send_text(message)
-    
-    async def broadcast(self, message: str):
-        for connection in self.active_connections:
-            try:
-                await connection.send_text(message)
-            except:
-                self.active_connections.remove(connection)
+manager = ConnectionManager(queue_size=settings.WS_CLIENT_QUEUE_SIZE, send_timeout=settings.WS_SEND_TIMEOUT)
+topics = TopicRegistry()
+manager.disconnect_listeners.append(topics.remove)
+# Fan-out across API workers; memory:// keeps everything in this process
+fanout = create_fanout(settings.WS_FANOUT_URL)
+DELTAS_CHANNEL = "deltas"
+READINGS_CHANNEL = "readings"
+ANOMALY_REPORTS_CHANNEL = "anomaly_reports"  # raw anomalies, any worker -> leader
+ANOMALIES_CHANNEL = "anomalies"  # numbered anomalies, leader -> every worker
+SNAPSHOT_KEY = "snapshot"
 
-manager = ConnectionManager()
+# State as seen by this worker's clients, followed from the published deltas
+deltas = DeltaTracker()
+# Authoritative state and latest readings, maintained by the leader's producer
+source = DeltaTracker()
+live_state = LiveState()
+producer_active = False
+# Recent deltas and anomalies for Server-Sent Events streams and their resumes
+event_log = EventLog(size=settings.SSE_BUFFER_SIZE, queue_size=settings.SSE_CLIENT_QUEUE_SIZE)
+# Fan-out channels owned by other modules (e.g. model reloads), channel -> handler
+channel_handlers: Dict[str, Callable[[Dict[str, Any]], Awaitable[None]]] = {}
+# Loop the fan-out backend runs on, so worker threads can publish through it
+loop: asyncio.AbstractEventLoop = None
+# This worker's LeaderElection, set by the app lifespan
+leader_election = None
 
 @router.websocket("/real-time")
 async def websocket_endpoint(websocket: WebSocket):
-    await manager.connect(websocket)
+    # Frame encoding is negotiated once: ?encoding=msgpack or the "msgpack" subprotocol
+    encoding, subprotocol = codec.negotiate(websocket)
+    await manager.connect(websocket, encoding, subprotocol)
     
     try:
-        # Send initial data
-        initial_stats = get_building_stats()
-        initial_message = WebSocketMessage(
-            type="initial_data",
-            data={"buildings": initial_stats, "timestamp": datetime.utcnow().isoformat()}
-        )
-        await websocket.send_text(initial_message.json())
+        # Send initial data: a snapshot of the tracked state and its sequence number
+        if deltas.seq == 0:
+            await sync_from_snapshot()
+        send_snapshot(websocket, "initial_data")
         
         # Keep connection alive and send updates
         while True:
             # Wait for client message (could be used for subscriptions)
-            data = await websocket.receive_text()
-            client_data = json.loads(data)
+            frame = await websocket.receive()
+            if frame["type"] == "websocket.disconnect":
+                raise WebSocketDisconnect(frame.get("code", 1000))
+            client_data = codec.decode(frame)
             
             # Handle client requests
             if client_data.get("type") == "subscribe":
                 building_id = client_data.get("building_id")
-                await handle_subscription(websocket, building_id)
+                await handle_subscription(websocket, building_id, client_data.get("data_types"))
+            elif client_data.get("type") == "unsubscribe":
+                await handle_unsubscription(websocket, client_data.get("building_id"), client_data.get("data_types"))
             elif client_data.get("type") == "request_update":
                 await send_stats_update(websocket)
+            elif client_data.get("type") == "request_snapshot":
+                # Sent by clients that detected a gap in the delta sequence
+                send_snapshot(websocket)
             
     except WebSocketDisconnect:
         manager.disconnect(websocket)
@@ -67,65 +83,252 @@ async def websocket_endpoint(websocket: WebSocket):
         print(f"WebSocket error: {e}")
         manager.disconnect(websocket)
 
-async def handle_subscription(websocket: WebSocket, building_id: str):
-    """Handle building-specific subscriptions"""
-    # For now, just acknowledge
-    ack_message = WebSocketMessage(
-        type="subscription_ack",
-        data={"building_id": building_id, "status": "subscribed"}
-    )
-    await websocket.send_text(ack_message.json())
+@router.get("/metrics")
+def get_broadcast_metrics():
+    """Connection counts, evictions and fan-out latency percentiles of the broadcaster"""
+    return {
+        **manager.metrics(),
+        "subscriptions": topics.stats(),
+        "event_bus": event_bus.stats(),
+        "fanout": type(fanout).__name__,
+        "sse": event_log.stats(),
+        "seq": deltas.seq,
+        "fanout_p99_target_ms": settings.WS_FANOUT_P99_TARGET_MS,
+    }
+
+async def handle_subscription(websocket: WebSocket, building_id: str, data_types: List[str] = None):
+    """Handle building-specific subscriptions.
+
+    Once subscribed, the client only receives the subscribed buildings and metrics
+    instead of the full campus payload.
+    """
+    if not building_id:
+        return
+    rejected = [t for t in data_types or () if t not in METRIC_FIELDS]
+    if data_types and len(rejected) == len(data_types):
+        manager.send_message(websocket, codec.message(
+            "subscription_ack",
+            {"building_id": building_id, "data_types": [], "rejected": rejected, "status": "error"}
+        ))
+        return
+    metrics = topics.subscribe(websocket, building_id, data_types)
+    manager.send_message(websocket, codec.message(
+        "subscription_ack",
+        {"building_id": building_id, "data_types": metrics, "rejected": rejected, "status": "subscribed"}
+    ))
+    # The client's view changed, resync it
+    send_snapshot(websocket)
+
+async def handle_unsubscription(websocket: WebSocket, building_id: str = None, data_types: List[str] = None):
+    """Drop subscriptions; a client with none left goes back to the full campus payload"""
+    topics.unsubscribe(websocket, building_id, data_types)
+    manager.send_message(websocket, codec.message(
+        "unsubscription_ack",
+        {"building_id": building_id, "status": "unsubscribed"}
+    ))
+    send_snapshot(websocket)
+
+async def publish_stats(stats: Dict[str, Any]):
+    """Publish what changed since the last update as a sequenced delta to every worker.
+
+    Only the leader's producer calls this. The full state is stored first so a worker that
+    notices a gap can resync from it.
+    """
+    seq, changes = source.update(stats)
+    if not changes:
+        return
+
+    _, state = source.snapshot()
+    await fanout.store(SNAPSHOT_KEY, {"epoch": source.epoch, "seq": seq, "buildings": state})
+    await fanout.publish(DELTAS_CHANNEL, {
+        "epoch": source.epoch,
+        "seq": seq,
+        "changes": changes,
+        "timestamp": datetime.utcnow().isoformat()
+    })
+
+async def deliver_delta(delta: Dict[str, Any]):
+    """Apply a delta from the leader and send it to this worker's clients.
+
+    Each client only gets its subscribed slice; each distinct slice is built once and
+    encoded once per negotiated encoding.
+    """
+    seq, epoch = delta["seq"], delta.get("epoch")
+    same_epoch = epoch == deltas.epoch
+    if same_epoch and seq <= deltas.seq:
+        return
+    if same_epoch and seq == deltas.seq + 1:
+        deltas.apply(seq, delta["changes"])
+        event_log.append((seq, 0), DELTA, delta)
+    else:
+        # This worker missed deltas or the leader started a new sequence; its WebSocket
+        # clients see the gap and ask for a snapshot, SSE streams get one pushed
+        snapshot = await fanout.load(SNAPSHOT_KEY)
+        if snapshot and snapshot.get("epoch") == epoch and snapshot["seq"] >= seq:
+            restore_state(snapshot["seq"], snapshot["buildings"], epoch)
+        else:
+            deltas.apply(seq, delta["changes"], epoch)
+            restore_state(*deltas.snapshot(), epoch)
+
+    for view, sockets in topics.group_by_view(manager.active_connections).items():
+        # Sent even when this slice is unchanged so every client sees each sequence number
+        await manager.broadcast_message(codec.message(
+            "delta",
+            {"seq": seq, "changes": filter_stats(delta["changes"], view), "timestamp": delta["timestamp"]}
+        ), sockets)
+
+async def sync_from_snapshot():
+    """Catch up a worker that has not seen any delta yet"""
+    snapshot = await fanout.load(SNAPSHOT_KEY)
+    if snapshot and (snapshot.get("epoch") != deltas.epoch or snapshot["seq"] > deltas.seq):
+        restore_state(snapshot["seq"], snapshot["buildings"], snapshot.get("epoch"))
+
+def restore_state(seq: int, buildings: Dict[str, Any], epoch: str = None):
+    deltas.restore(seq, buildings, epoch)
+    # Event history from before the snapshot is incomplete: older resumes get a snapshot,
+    # and open SSE streams are sent this one
+    event_log.reset(deltas.epoch, (seq, 0), snapshot_event(seq, deltas.state))
+
+def snapshot_event(seq: int, buildings: Dict[str, Any]) -> Dict[str, Any]:
+    return {"seq": seq, "buildings": buildings, "timestamp": datetime.utcnow().isoformat()}
+
+async def publish_anomaly(anomaly: Dict[str, Any]):
+    """Number an anomaly after the latest delta and publish it to every worker. Leader only."""
+    await fanout.publish(ANOMALIES_CHANNEL, {"id": source.next_event_id(), "epoch": source.epoch, **anomaly})
+
+async def deliver_anomaly(anomaly: Dict[str, Any]):
+    """Send an anomaly to clients watching its building and metric, and to SSE streams"""
+    parsed = parse_event_id(anomaly["id"])
+    # Numbered in another epoch (this worker hasn't resynced yet): live clients only
+    if parsed and anomaly.get("epoch") == event_log.epoch:
+        event_log.append(parsed[1], "anomaly", anomaly)
+    topic = (anomaly["building_id"], anomaly["data_type"])
+    sockets = [
+        websocket for view, group in topics.group_by_view(manager.active_connections).items()
+        if view is None or topic in view
+        for websocket in group
+    ]
+    if sockets:
+        await manager.broadcast_message(codec.message("anomaly", anomaly), sockets)
+
+def send_snapshot(websocket: WebSocket, message_type: str = "snapshot"):
+    """Send the full tracked state (within the client's subscriptions) and its sequence number"""
+    seq, state = deltas.snapshot()
+    manager.send_message(websocket, codec.message(message_type, {
+        "seq": seq,
+        "buildings": filter_stats(state, topics.view(websocket)),
+        "timestamp": datetime.utcnow().isoformat()
+    }))
 
 async def send_stats_update(websocket: WebSocket):
     """Send updated building stats"""
-    stats = get_building_stats()
+    stats = await get_building_stats_async()
     
-    update_message = WebSocketMessage(
-        type="stats_update",
-        data={
-            "buildings": stats,
-            "timestamp": datetime.utcnow().isoformat(),
-            "campus_avg": sum(b['sustainability_score'] for b in stats.values() if b['sustainability_score'] > 0) / len(stats)
-        }
-    )
-    
-    await websocket.send_text(update_message.json())
-
-# Background task to broadcast periodic updates
-async def broadcast_updates():
-    """Periodically broadcast updates to all connected clients"""
-    while True:
-        if manager.active_connections:
-            stats = get_building_stats()
-            
-            # Simulate some real-time changes
-            for building in stats:
-                # Add small random variations
-                stats[building]['sustainability_score'] += random.uniform(-1, 1)
-                stats[building]['sustainability_score'] = max(0, min(100, stats[building]['sustainability_score']))
-                
-                # Update status based on score
-                score = stats[building]['sustainability_score']
-                if score > 70:
-                    stats[building]['status'] = 'good'
-                elif score > 40:
-                    stats[building]['status'] = 'warning'
-                else:
-                    stats[building]['status'] = 'critical'
-            
-            update_message = WebSocketMessage(
-                type="real_time_update",
-                data={
-                    "buildings": stats,
-                    "timestamp": datetime.utcnow().isoformat()
-                }
-            )
-            
-            await manager.broadcast(update_message.json())
-        
-        # Wait 10 seconds before next update
-        await asyncio.sleep(10)
+    manager.send_message(websocket, codec.message("stats_update", {
+        "buildings": filter_stats(stats, topics.view(websocket)),
+        "timestamp": datetime.utcnow().isoformat(),
+        "campus_avg": sum(b['sustainability_score'] for b in stats.values() if b['sustainability_score'] > 0) / len(stats)
+    }))
 
-# Start broadcast task when module loads
-import asyncio
-asyncio.create_task(broadcast_updates())
\ No newline at end of file
+async def on_fanout_message(channel: str, message: Dict[str, Any]):
+    if channel == DELTAS_CHANNEL:
+        await deliver_delta(message)
+    elif channel == ANOMALIES_CHANNEL:
+        await deliver_anomaly(message)
+    elif channel == READINGS_CHANNEL:
+        # Only the leader's producer subscribes to these
+        event_bus.publish(CAMPUS_READINGS, message)
+    elif channel == ANOMALY_REPORTS_CHANNEL and producer_active:
+        await publish_anomaly(message)
+    elif channel in channel_handlers:
+        await channel_handlers[channel](message)
+
+def is_leader() -> bool:
+    return leader_election is not None and leader_election.is_leader
+
+def publish_from_thread(channel: str, message: Dict[str, Any]):
+    """Publish to every worker from a non-async thread; a no-op before start_realtime"""
+    if loop is None:
+        return
+    future = asyncio.run_coroutine_threadsafe(fanout.publish(channel, message), loop)
+    future.add_done_callback(lambda f: f.exception() and logger.warning(f"Could not publish {channel}: {f.exception()}"))
+
+def store_from_thread(key: str, value: Dict[str, Any]):
+    """Store a shared value from a non-async thread; a no-op before start_realtime"""
+    if loop is None:
+        return
+    future = asyncio.run_coroutine_threadsafe(fanout.store(key, value), loop)
+    future.add_done_callback(lambda f: f.exception() and logger.warning(f"Could not store {key}: {f.exception()}"))
+
+async def relay(topic: str, channel: str):
+    """Forward events raised on this worker to the leader's producer"""
+    queue = event_bus.subscribe(topic)
+    try:
+        while True:
+            event = await queue.get()
+            try:
+                await fanout.publish(channel, event)
+            except Exception as e:
+                logger.warning(f"Could not relay {topic}: {e}")
+    finally:
+        event_bus.unsubscribe(topic, queue)
+
+async def seed_live_state():
+    """Baseline the live state so buildings have values before their next reading.
+
+    A new leader continues from the stored snapshot; otherwise one stats query is used.
+    """
+    snapshot = await fanout.load(SNAPSHOT_KEY)
+    if snapshot:
+        source.restore(snapshot["seq"], snapshot["buildings"], snapshot.get("epoch"))
+        live_state.seed(snapshot["buildings"])
+        return
+    try:
+        stats = await get_building_stats_async()
+    except QueryTimeoutError as e:
+        print(f"Could not seed live state: {e}")
+        return
+    live_state.seed(stats)
+    await publish_stats(stats)
+
+async def run_producer():
+    """Turn readings into deltas as they are written. Runs on the elected leader only.
+
+    Readings arrive from every worker through the fan-out backend; there is no polling and
+    no read-back from InfluxDB. Readings that queued up while a delta was being published
+    are merged into the next one.
+    """
+    global producer_active
+    queue = event_bus.subscribe(CAMPUS_READINGS)
+    producer_active = True
+    try:
+        await seed_live_state()
+        while True:
+            event = await queue.get()
+            readings = {building: dict(values) for building, values in event["readings"].items()}
+            while not queue.empty():
+                for building, values in queue.get_nowait()["readings"].items():
+                    readings.setdefault(building, {}).update(values)
+            try:
+                await publish_stats(live_state.apply(readings))
+            except Exception as e:
+                logger.error(f"Could not publish live update: {e}")
+    finally:
+        producer_active = False
+        event_bus.unsubscribe(CAMPUS_READINGS, queue)
+
+relay_tasks: List[asyncio.Task] = []
+
+async def start_realtime():
+    """Connect this worker to the fan-out backend; called from the app lifespan"""
+    global loop
+    loop = asyncio.get_running_loop()
+    await fanout.start(on_fanout_message)
+    relay_tasks.append(asyncio.create_task(relay(READINGS, READINGS_CHANNEL)))
+    relay_tasks.append(asyncio.create_task(relay(ANOMALIES, ANOMALY_REPORTS_CHANNEL)))
+
+async def stop_realtime():
+    for task in relay_tasks:
+        task.cancel()
+    relay_tasks.clear()
+    await fanout.stop()
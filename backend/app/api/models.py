@@ -33,6 +33,12 @@ class PredictionRequest(BaseModel):
     hours_ahead: int = Field(24, ge=1, le=168, description="Hours to predict ahead")
     include_anomaly: bool = False
 
+class BatchPredictionRequest(BaseModel):
+    building_ids: List[str] = Field(..., min_length=1, description="Buildings to forecast")
+    data_types: List[str] = Field(["energy", "water", "occupancy"], min_length=1)
+    hours_ahead: int = Field(24, ge=1, le=168, description="Hours to predict ahead")
+    include_anomaly: bool = False
+
 class PredictionResponse(BaseModel):
     building_id: str
     data_type: str
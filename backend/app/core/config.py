@@ -1,6 +1,16 @@
+import os
+
+from pydantic import model_validator
 from pydantic_settings import BaseSettings
 from typing import Optional
 
+
+def available_cpus() -> int:
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
 class Settings(BaseSettings):
     # API Configuration
     API_V1_STR: str = "/api/v1"
@@ -14,15 +24,82 @@ class Settings(BaseSettings):
     INFLUXDB_TOKEN: str = "my-super-secret-auth-token"
     INFLUXDB_ORG: str = "campus_org"
     INFLUXDB_BUCKET: str = "campus_data"
+    INFLUX_QUERY_CONCURRENCY: int = 8  # blocking queries allowed in flight at once
+    INFLUX_QUERY_TIMEOUT: float = 30.0  # seconds per query, including time spent waiting for a slot
+
+    # Write Pipeline
+    WRITE_BATCH_SIZE: int = 5000  # points per HTTP write
+    WRITE_FLUSH_INTERVAL: float = 1.0  # seconds before a partial batch is sent
+    WRITE_QUEUE_MAX_SIZE: int = 100000  # points buffered before producers block
+    WRITE_BACKPRESSURE_TIMEOUT: float = 5.0  # seconds a producer waits before points are dropped
+    WRITE_MAX_RETRIES: int = 3
+    WRITE_RETRY_BASE_DELAY: float = 0.5  # seconds, doubled per attempt with jitter
+
+    # Rollups (hourly/daily aggregate buckets)
+    ROLLUPS_ENABLED: bool = True
+    ROLLUP_INTERVAL: int = 300  # seconds between downsampler runs
+    ROLLUP_BACKFILL_DAYS: int = 30  # history rolled up when a rollup bucket is first created
+    ROLLUP_LOOKBACK_WINDOWS: int = 2  # completed windows re-rolled each run to pick up late writes
+    ROLLUP_MIN_INTERVALS: int = 48  # a rollup is only read when the range spans this many of its windows
+    ROLLUP_HOURLY_RETENTION_DAYS: int = 365
+    ROLLUP_DAILY_RETENTION_DAYS: int = 0  # 0 keeps data forever
+    RAW_RETENTION_DAYS: int = 0  # retention applied to the raw bucket; 0 leaves it unchanged (opt-in)
+
+    # Stats Cache
+    STATS_CACHE_TTL: float = 60.0  # seconds; writes invalidate the cache sooner
     
     # Simulation Settings
     SIMULATION_INTERVAL: int = 5  # seconds between data points
     CAMPUS_BUILDINGS: int = 10
+    SIMULATION_TICK_MODE: str = "matrix"  # "matrix" (one vectorized batch per tick) or "scalar"
+
+    # Initial Seeding
+    SEED_DAYS: float = 7  # days of history loaded into an empty bucket
+    SEED_RESOLUTION_MINUTES: int = 15
+    SEED_BUILDINGS: Optional[int] = None  # defaults to CAMPUS_BUILDINGS
+    SEED_RANDOM_SEED: Optional[int] = None
+    SEED_CHUNK_POINTS: int = 100000  # points per line-protocol request
+    SEED_WORKERS: int = 4  # parallel write requests
     
+    # WebSocket Broadcasting
+    WS_CLIENT_QUEUE_SIZE: int = 32  # outbound messages buffered per client before it is evicted
+    WS_SEND_TIMEOUT: float = 5.0  # seconds a single send may take before the client is evicted
+    WS_FANOUT_P99_TARGET_MS: float = 50.0  # fan-out latency goal; the load test's default saturation budget
+    WS_FANOUT_URL: str = "memory://"  # redis://host:6379/0 or unix:///path/redis.sock to span workers
+    LEADER_LEASE_SECONDS: float = 15.0  # lease held by the worker running simulation, producers and rollups
+
+    # Server-Sent Events
+    SSE_BUFFER_SIZE: int = 1000  # recent events kept for Last-Event-ID resume
+    SSE_CLIENT_QUEUE_SIZE: int = 256  # events buffered per stream before it is dropped (and resumes)
+    SSE_HEARTBEAT_SECONDS: float = 15.0  # comment lines keeping idle proxies from closing the stream
+    SSE_RETRY_MS: int = 3000  # reconnect delay suggested to EventSource clients
+
     # ML Settings
     ML_MODEL_PATH: str = "models/"
+    FORECAST_CACHE_SIZE: int = 512  # cached forecasts (data type x horizon x options)
+    FORECAST_CACHE_HORIZONS: list = [12, 24, 48, 168]  # horizons precomputed at load and each hour
+    MODEL_REGISTRY_HISTORY: int = 2  # previous model sets kept for rollback
+    ML_COMPILE_MODELS: bool = True  # serve forests from flattened node arrays (falls back to sklearn on mismatch)
+    # Retraining runs in a separate process with these limits (0 = unlimited)
+    RETRAIN_MAX_MEMORY_MB: int = 4096  # address space of the training process
+    RETRAIN_MAX_CPU_SECONDS: int = 3600  # CPU time before the job is killed
+    # Cores the training process may run on; its stages and forests parallelize across all of
+    # them. The default leaves one core to the API; 1 keeps training from competing with
+    # requests at all but runs the stages one after another. RETRAIN_MAX_CPU_SECONDS counts
+    # CPU time over every core.
+    RETRAIN_CPUS: int = max(1, available_cpus() - 1)
+    RETRAIN_NICE: int = 10  # scheduling priority below the API
     DEBUG: bool = False
 
+    @model_validator(mode="after")
+    def check_raw_retention(self):
+        # Seeded history older than the retention would be expired as soon as it is written
+        if 0 < self.RAW_RETENTION_DAYS < self.SEED_DAYS:
+            raise ValueError(
+                f"RAW_RETENTION_DAYS ({self.RAW_RETENTION_DAYS}) must be 0 or at least SEED_DAYS ({self.SEED_DAYS})"
+            )
+        return self
+
     
     class Config:
         env_file = ".env"
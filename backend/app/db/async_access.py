@@ -0,0 +1,109 @@
+import asyncio
+import functools
+import itertools
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, AsyncIterator, Callable, Dict, Iterable, List, Optional
+from app.core.config import settings
+from app.db.influx_client import query_sensor_data, query_sensor_columns, stream_sensor_data, write_sensor_data
+from app.db.stats_cache import stats_cache
+
+logger = logging.getLogger(__name__)
+
+# Blocking InfluxDB calls run on this bounded pool so they never stall the event loop
+_executor = ThreadPoolExecutor(max_workers=settings.INFLUX_QUERY_CONCURRENCY, thread_name_prefix="influx-query")
+_slots = asyncio.Semaphore(settings.INFLUX_QUERY_CONCURRENCY)
+
+
+class QueryTimeoutError(Exception):
+    """Raised when a database call does not finish within its timeout"""
+
+
+async def run_query(fn: Callable, *args, timeout: Optional[float] = None, **kwargs) -> Any:
+    """Run a blocking InfluxDB call on the query pool.
+
+    At most INFLUX_QUERY_CONCURRENCY calls run at once; waiting for a slot counts toward
+    `timeout` (INFLUX_QUERY_TIMEOUT by default). If the caller is cancelled or times out
+    before the call starts it is dropped; a call already in flight is bounded by the
+    client's HTTP timeout and keeps its slot until it returns.
+    """
+    timeout = settings.INFLUX_QUERY_TIMEOUT if timeout is None else timeout
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+
+    try:
+        await asyncio.wait_for(_slots.acquire(), timeout)
+    except asyncio.TimeoutError:
+        raise QueryTimeoutError(f"{fn.__name__} timed out waiting for a query slot")
+
+    try:
+        future = _executor.submit(functools.partial(fn, *args, **kwargs))
+    except BaseException:
+        _slots.release()
+        raise
+    future.add_done_callback(lambda _: loop.call_soon_threadsafe(_slots.release))
+
+    try:
+        return await asyncio.wait_for(asyncio.wrap_future(future), max(0.0, deadline - loop.time()))
+    except asyncio.TimeoutError:
+        future.cancel()
+        logger.warning(f"{fn.__name__} exceeded {timeout}s timeout")
+        raise QueryTimeoutError(f"{fn.__name__} exceeded {timeout}s timeout")
+    except asyncio.CancelledError:
+        future.cancel()
+        raise
+
+
+async def query_sensor_data_async(building_id: str = None, data_type: str = None, hours: int = 24, limit: int = 1000,
+                                  every: int = None) -> List[Dict[str, Any]]:
+    return await run_query(query_sensor_data, building_id, data_type, hours, limit, every)
+
+
+async def query_sensor_columns_async(building_id: str = None, data_type: str = None, hours: int = 24, limit: int = 1000,
+                                    every: int = None) -> List[Dict[str, Any]]:
+    return await run_query(query_sensor_columns, building_id, data_type, hours, limit, every)
+
+
+async def iterate_in_pool(iterable: Iterable, chunk_size: int = 500) -> AsyncIterator[List[Any]]:
+    """Drain a blocking iterator on the query pool, yielding it in chunks of up to `chunk_size`"""
+    iterator = iter(iterable)
+
+    def _next_chunk():
+        return list(itertools.islice(iterator, chunk_size))
+
+    try:
+        while True:
+            chunk = await run_query(_next_chunk)
+            if not chunk:
+                break
+            yield chunk
+    finally:
+        close = getattr(iterator, "close", None)
+        if close:
+            try:
+                close()
+            except ValueError:
+                # Still executing in a pool thread after a cancelled chunk; it ends with the HTTP timeout
+                pass
+
+
+def stream_sensor_data_async(building_id: str = None, data_type: str = None, hours: int = 24, limit: int = 1000,
+                             every: int = None, chunk_size: int = 500) -> AsyncIterator[List[Dict[str, Any]]]:
+    return iterate_in_pool(stream_sensor_data(building_id, data_type, hours, limit, every), chunk_size)
+
+
+async def get_building_stats_async(hours: int = 24) -> Dict[str, Any]:
+    # Fresh cache entries are served straight from the event loop
+    cached = stats_cache.peek(hours)
+    if cached is not None:
+        return cached
+    return await run_query(stats_cache.get, hours)
+
+
+async def write_sensor_data_async(building_id: str, data_type: str, value: float, timestamp=None) -> bool:
+    # Submitting can block on write-buffer backpressure
+    return await run_query(write_sensor_data, building_id, data_type, value, timestamp)
+
+
+def shutdown_executor():
+    _executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,50 @@
+import math
+from typing import Tuple
+import numpy as np
+
+# Raw resolution fetched for LTTB relative to the requested point count
+LTTB_OVERSAMPLE = 4
+
+
+def window_for(hours: int, max_points: int) -> int:
+    """Smallest aggregateWindow period (seconds) that keeps a series under `max_points` over the range"""
+    return max(1, math.ceil(hours * 3600 / max_points))
+
+
+def lttb(times: np.ndarray, values: np.ndarray, threshold: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Largest-Triangle-Three-Buckets downsampling.
+
+    Keeps the first and last points and, for every bucket in between, the point that forms
+    the largest triangle with the previously selected point and the next bucket's mean.
+    Peaks and troughs survive where a plain mean would flatten them.
+    """
+    n = len(values)
+    if threshold >= n or threshold < 3:
+        return times, values
+
+    x = times.astype(np.float64)
+    y = values.astype(np.float64)
+
+    # Bucket edges over the interior points (first and last are always kept)
+    edges = np.linspace(1, n - 1, threshold - 1).astype(np.int64)
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = n - 1
+
+    a = 0
+    for i in range(threshold - 2):
+        start, end = edges[i], edges[i + 1]
+        if i + 2 < len(edges):
+            next_start, next_end = edges[i + 1], edges[i + 2]
+        else:
+            next_start, next_end = n - 1, n
+        avg_x = x[next_start:next_end].mean()
+        avg_y = y[next_start:next_end].mean()
+
+        bucket_x = x[start:end]
+        bucket_y = y[start:end]
+        areas = np.abs((x[a] - avg_x) * (bucket_y - y[a]) - (x[a] - bucket_x) * (avg_y - y[a]))
+        a = start + int(np.argmax(areas))
+        selected[i + 1] = a
+
+    return times[selected], values[selected]
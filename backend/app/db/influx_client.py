@@ -1,9 +1,12 @@
 from influxdb_client import InfluxDBClient, Point, WritePrecision
 from influxdb_client.client.write_api import SYNCHRONOUS
-from datetime import datetime, timedelta
-import random
+from datetime import datetime
 from typing import List, Dict, Any
+import numpy as np
 from app.core.config import settings
+from app.db.write_buffer import BufferedWriter
+from app.db.rollups import resolve_bucket
+from app.realtime.event_bus import event_bus, READINGS
 import sys
 import logging
 logging.basicConfig(
@@ -17,18 +20,43 @@ logger = logging.getLogger(__name__)
 client = None
 write_api = None
 query_api = None
+writer = None
+write_listeners = []
+
+def add_write_listener(listener):
+    """Register a callback invoked with the point count after each batch reaches InfluxDB"""
+    write_listeners.append(listener)
+
+def _notify_write_listeners(count: int):
+    for listener in write_listeners:
+        listener(count)
 
 def init_influxdb():
-    global client, write_api, query_api
+    global client, write_api, query_api, writer
     try:
         client = InfluxDBClient(
             url=settings.INFLUXDB_URL,
             token=settings.INFLUXDB_TOKEN,
-            org=settings.INFLUXDB_ORG
+            org=settings.INFLUXDB_ORG,
+            timeout=int(settings.INFLUX_QUERY_TIMEOUT * 1000)
         )
 
         write_api = client.write_api(write_options=SYNCHRONOUS)
         query_api = client.query_api()
+
+        # All point writes go through the buffered writer, which batches them
+        # into a single HTTP request instead of one round trip per point
+        writer = BufferedWriter(
+            write_fn=_write_records,
+            batch_size=settings.WRITE_BATCH_SIZE,
+            flush_interval=settings.WRITE_FLUSH_INTERVAL,
+            max_queue_size=settings.WRITE_QUEUE_MAX_SIZE,
+            max_retries=settings.WRITE_MAX_RETRIES,
+            retry_base_delay=settings.WRITE_RETRY_BASE_DELAY,
+            backpressure_timeout=settings.WRITE_BACKPRESSURE_TIMEOUT,
+            on_batch_written=_notify_write_listeners,
+        )
+        writer.start()
         
         logger.info(f"✅ Connected to InfluxDB at {settings.INFLUXDB_URL}")
         
@@ -37,9 +65,18 @@ def init_influxdb():
         # In a script, you might want to exit. In a web server, you might just log it.
         raise 
 
-def write_sensor_data(building_id: str, data_type: str, value: float, timestamp=None):
+def _write_records(records: List[str]):
+    """Send a batch of line-protocol records in one request (used by the buffered writer)"""
+    write_api.write(
+        bucket=settings.INFLUXDB_BUCKET,
+        org=settings.INFLUXDB_ORG,
+        record=records,
+        write_precision=WritePrecision.NS
+    )
+
+def write_sensor_data(building_id: str, data_type: str, value: float, timestamp=None, block: bool = True):
     # CRITICAL: Check if API exists before using it
-    if not write_api:
+    if not writer:
         logger.error("Write API not initialized. Call init_influxdb() first.")
         return False
 
@@ -52,21 +89,89 @@ def write_sensor_data(building_id: str, data_type: str, value: float, timestamp=
         .field("value", float(value)) \
         .time(timestamp, WritePrecision.NS)
     
-    try:
-        write_api.write(bucket=settings.INFLUXDB_BUCKET, org=settings.INFLUXDB_ORG, record=point)
-        return True
-    except Exception as e:
-        logger.error(f"Error writing to InfluxDB: {e}")
+    accepted = writer.submit([point.to_line_protocol()], block=block)
+    if accepted:
+        # Push the reading to live consumers without waiting for it to be flushed and read back
+        event_bus.publish(READINGS, {
+            "timestamp": timestamp.isoformat(),
+            "readings": {building_id: {data_type: float(value)}}
+        })
+    return accepted
+
+def sensor_line_prefixes(buildings: List[str], data_types: List[str]) -> np.ndarray:
+    """Line-protocol prefix for every (building, type) series, shaped (buildings, types)"""
+    return np.array([
+        [f"sensor_data,building={building},type={data_type} value=" for data_type in data_types]
+        for building in buildings
+    ], dtype=object)
+
+def write_sensor_matrix(prefixes: np.ndarray, values: np.ndarray, timestamp=None, block: bool = True) -> bool:
+    """Queue a whole (building, type) matrix of readings sharing one timestamp as a single batch.
+
+    Pass block=False from the event loop: a full write buffer then drops the batch at once.
+    """
+    if not writer:
+        logger.error("Write API not initialized. Call init_influxdb() first.")
         return False
 
-def query_sensor_data(building_id: str = None, data_type: str = None, hours: int = 24, limit: int = 1000):
-    if not query_api:
-        logger.error("Query API not initialized.")
-        return []
+    if not timestamp:
+        timestamp = datetime.utcnow()
+    ts_ns = str(np.datetime64(timestamp, "ns").astype(np.int64))
+
+    lines = prefixes + np.char.mod("%.2f", values).astype(object) + f" {ts_ns}"
+    return writer.submit(lines.ravel().tolist(), block=block)
+
+def write_line_protocol(lines: str):
+    """Write a pre-formatted chunk of line protocol in one request, bypassing the buffer.
+
+    Used for bulk loads where the caller already batches and parallelizes the writes.
+    Raises on failure so the caller can decide whether to retry.
+    """
+    if not write_api:
+        raise RuntimeError("Write API not initialized. Call init_influxdb() first.")
+    write_api.write(
+        bucket=settings.INFLUXDB_BUCKET,
+        org=settings.INFLUXDB_ORG,
+        record=lines,
+        write_precision=WritePrecision.NS
+    )
+
+def flush_writes(timeout: float = None) -> bool:
+    """Block until every buffered point has been sent to InfluxDB"""
+    if not writer:
+        return True
+    return writer.flush(timeout)
+
+def close_influxdb(timeout: float = 30.0):
+    """Flush pending writes and release the client"""
+    global client, write_api, query_api, writer
+    if writer:
+        writer.stop(timeout)
+        stats = writer.stats()
+        logger.info(
+            f"Write pipeline closed: {stats['points_written']} written, "
+            f"{stats['points_dropped']} dropped, {stats['points_retried']} retried"
+        )
+        writer = None
+    if client:
+        client.close()
+        client = None
+    write_api = None
+    query_api = None
+
+def get_write_stats() -> Dict[str, Any]:
+    """Counters and batch latency of the buffered write pipeline"""
+    if not writer:
+        return {"initialized": False}
+    return {"initialized": True, **writer.stats()}
+
+def build_sensor_query(building_id: str = None, data_type: str = None, hours: int = 24, limit: int = 1000, every: int = None) -> str:
+    # Windowed queries can be answered from a rollup bucket no coarser than the window
+    bucket = resolve_bucket(hours, every) if every else settings.INFLUXDB_BUCKET
 
     # Note the newlines \n to ensure the query segments don't merge incorrectly
     query = f'''
-    from(bucket: "{settings.INFLUXDB_BUCKET}")
+    from(bucket: "{bucket}")
         |> range(start: -{hours}h)
         |> filter(fn: (r) => r._measurement == "sensor_data")
     '''
@@ -76,8 +181,28 @@ def query_sensor_data(building_id: str = None, data_type: str = None, hours: int
     
     if data_type:
         query += f'\n|> filter(fn: (r) => r.type == "{data_type}")'
+
+    if every:
+        # Let InfluxDB reduce long ranges to one mean per window
+        query += f'\n|> aggregateWindow(every: {every}s, fn: mean, createEmpty: false)'
     
     query += f'\n|> limit(n: {limit})'
+    return query
+
+def _record_to_row(record) -> Dict[str, Any]:
+    return {
+        "building": record.values.get("building"),
+        "type": record.values.get("type"),
+        "value": record.get_value(),
+        "time": record.get_time().isoformat()
+    }
+
+def query_sensor_data(building_id: str = None, data_type: str = None, hours: int = 24, limit: int = 1000, every: int = None):
+    if not query_api:
+        logger.error("Query API not initialized.")
+        return []
+
+    query = build_sensor_query(building_id, data_type, hours, limit, every)
     
     try:
         # Pass the org here as well to be safe
@@ -86,146 +211,196 @@ def query_sensor_data(building_id: str = None, data_type: str = None, hours: int
         
         for table in tables:
             for record in table.records:
-                results.append({
-                    "building": record.values.get("building"),
-                    "type": record.values.get("type"),
-                    "value": record.get_value(),
-                    "time": record.get_time().isoformat()
-                })
+                results.append(_record_to_row(record))
         return results
     except Exception as e:
         logger.error(f"Error querying InfluxDB: {e}")
         return []
 
+def query_sensor_columns(building_id: str = None, data_type: str = None, hours: int = 24, limit: int = 1000, every: int = None) -> List[Dict[str, Any]]:
+    """Query sensor data as one columnar entry per (building, type) series.
+
+    Each entry carries parallel `times` (epoch milliseconds, int64) and `values` (float64)
+    NumPy arrays instead of a dict per point. With `every`, points are window means.
+    """
+    if not query_api:
+        logger.error("Query API not initialized.")
+        return []
+
+    query = build_sensor_query(building_id, data_type, hours, limit, every)
+
+    try:
+        tables = query_api.query(query, org=settings.INFLUXDB_ORG)
+    except Exception as e:
+        logger.error(f"Error querying InfluxDB: {e}")
+        return []
+
+    series = {}
+    for table in tables:
+        if not table.records:
+            continue
+        first = table.records[0]
+        key = (first.values.get("building"), first.values.get("type"))
+        times = np.fromiter((int(r.get_time().timestamp() * 1000) for r in table.records), dtype=np.int64, count=len(table.records))
+        values = np.fromiter((r.get_value() for r in table.records), dtype=np.float64, count=len(table.records))
+        if key in series:
+            series[key] = (np.concatenate([series[key][0], times]), np.concatenate([series[key][1], values]))
+        else:
+            series[key] = (times, values)
+
+    return [
+        {"building": building, "type": data_type, "times": times, "values": values}
+        for (building, data_type), (times, values) in series.items()
+    ]
+
+def stream_sensor_data(building_id: str = None, data_type: str = None, hours: int = 24, limit: int = 1000, every: int = None):
+    """Yield sensor rows one at a time as InfluxDB streams them back.
+
+    Unlike query_sensor_data nothing is accumulated, so memory stays flat regardless of
+    result size. The query is only sent once the generator is first advanced, so errors
+    (including an uninitialized client) are raised from the iteration.
+    """
+    if not query_api:
+        raise RuntimeError("Query API not initialized. Call init_influxdb() first.")
+
+    query = build_sensor_query(building_id, data_type, hours, limit, every)
+    records = query_api.query_stream(query, org=settings.INFLUXDB_ORG)
+    try:
+        for record in records:
+            yield _record_to_row(record)
+    finally:
+        records.close()
+
 def create_initial_data():
     """Create initial synthetic data for demonstration"""
-    # 1. Check if data already exists
-    query = f'from(bucket:"{settings.INFLUXDB_BUCKET}") |> range(start: -1y) |> limit(n:1)'
+    from app.simulation.seeder import seed_history, last_seed_run
+
+    seed_args = dict(
+        n_buildings=settings.SEED_BUILDINGS or settings.CAMPUS_BUILDINGS,
+        seed=settings.SEED_RANDOM_SEED,
+        chunk_points=settings.SEED_CHUNK_POINTS,
+        workers=settings.SEED_WORKERS,
+    )
+
+    # 1. Finish a run that was interrupted, over the same time grid
+    run = last_seed_run()
+    if run is not None:
+        if run["completed"]:
+            print("⏭️ Data already seeded. Skipping seeding.")
+            return
+        print(f"🌱 Resuming interrupted seeding up to {run['end_time']}...")
+        seed_history(days=run["days"], resolution_minutes=run["resolution_minutes"], end_time=run["end_time"], **seed_args)
+        logger.info("Initial data created successfully")
+        return
+
+    # 2. Buckets filled before runs were recorded
+    query = f'from(bucket:"{settings.INFLUXDB_BUCKET}") |> range(start: -1y) |> filter(fn: (r) => r._measurement == "sensor_data") |> limit(n:1)'
     result = query_api.query(query)
     
     if len(result) > 0:
         print("⏭️ Data already exists. Skipping seeding.")
         return
 
-    # 2. If no data, run your seeding logic
+    # 3. If no data, bulk-load the synthetic history
     print("🌱 Seeding initial campus data...")
-    buildings = [f"building_{i}" for i in range(1, settings.CAMPUS_BUILDINGS + 1)]
-    data_types = ["energy", "water", "occupancy", "temperature", "co2"]
-    
-    # Generate data for the last 7 days
-    end_time = datetime.utcnow()
-    start_time = end_time - timedelta(days=7)
-    
-    current_time = start_time
-    while current_time < end_time:
-        for building in buildings:
-            for data_type in data_types:
-                # Generate realistic values based on data type (all as floats)
-                if data_type == "energy":
-                    value = random.uniform(50.0, 200.0)  # kWh
-                elif data_type == "water":
-                    value = random.uniform(100.0, 500.0)  # liters
-                elif data_type == "occupancy":
-                    value = float(random.randint(0, 200))  # people (as float)
-                elif data_type == "temperature":
-                    value = random.uniform(18.0, 25.0)  # degrees C
-                elif data_type == "co2":
-                    value = random.uniform(400.0, 800.0)  # ppm
-                
-                # Add daily pattern
-                hour = current_time.hour
-                if 8 <= hour <= 18:  # Daytime
-                    value *= random.uniform(1.2, 2.0)
-                else:  # Nighttime
-                    value *= random.uniform(0.3, 0.8)
-                
-                # Write data point
-                write_sensor_data(building, data_type, value, current_time)
-        
-        # Move to next time interval (15 minutes)
-        current_time += timedelta(minutes=15)
+    seed_history(days=settings.SEED_DAYS, resolution_minutes=settings.SEED_RESOLUTION_MINUTES, **seed_args)
     
     logger.info("Initial data created successfully")
 
+# Data types that feed the sustainability score, in matrix column order
+STATS_TYPES = ["energy", "water", "co2", "occupancy"]
+
+def score_buildings(means: np.ndarray):
+    """Vectorized sustainability scoring over an (N, len(STATS_TYPES)) matrix of means.
+
+    Weighted heuristic: Energy (50%), Water (30%), CO2 (20%), with 400ppm as the CO2 baseline.
+    Returns the rounded scores and the status label for every row.
+    """
+    energy, water, co2 = means[:, 0], means[:, 1], means[:, 2]
+
+    energy_score = np.maximum(0, 100 - energy / 5)
+    water_score = np.maximum(0, 100 - water / 10)
+    co2_score = np.maximum(0, 100 - (co2 - 400) / 10)
+    final_score = (energy_score * 0.5) + (water_score * 0.3) + (co2_score * 0.2)
+
+    status = np.select([final_score > 70, final_score > 40], ["good", "warning"], default="critical")
+    return np.round(final_score, 0), status
+
+def building_stats_row(building: str, means: np.ndarray, score: float, status: str) -> Dict[str, Any]:
+    """Stats dict for one building from its row of STATS_TYPES means and its score"""
+    energy, water, co2, _ = np.round(means, 2).tolist()
+    return {
+        "building_id": building,
+        "avg_energy": energy,
+        "water_usage": water,
+        "co2_levels": co2,
+        "occupancy": int(means[3]),
+        "sustainability_score": float(score),
+        "status": str(status)
+    }
+
+def _empty_building_stats(building: str, status: str) -> Dict[str, Any]:
+    return {
+        "building_id": building,
+        "avg_energy": 0,
+        "water_usage": 0,
+        "co2_levels": 0,
+        "occupancy": 0,
+        "sustainability_score": 0,
+        "status": status
+    }
+
 def get_building_stats(hours: int = 24): 
-    """Get statistics for all buildings including water, co2, and occupancy"""
+    """Get statistics for all buildings including water, co2, and occupancy.
+
+    A single grouped Flux query returns the mean of every (building, type) series,
+    so the cost does not grow with the number of buildings.
+    """
     buildings = [f"building_{i}" for i in range(1, settings.CAMPUS_BUILDINGS + 1)]
+    type_filter = " or ".join(f'r.type == "{t}"' for t in STATS_TYPES)
+    # Long windows read hourly/daily means instead of scanning every raw point
+    bucket = resolve_bucket(hours)
+
+    query = f'''
+    from(bucket: "{bucket}")
+        |> range(start: -{hours}h)
+        |> filter(fn: (r) => r._measurement == "sensor_data")
+        |> filter(fn: (r) => {type_filter})
+        |> group(columns: ["building", "type"])
+        |> mean()
+        |> keep(columns: ["building", "type", "_value"])
+    '''
+
+    try:
+        tables = query_api.query(query, org=settings.INFLUXDB_ORG)
+    except Exception as e:
+        logger.error(f"Error getting building stats: {e}")
+        return {building: _empty_building_stats(building, "error") for building in buildings}
+
+    # Scatter the grouped means into a (buildings, types) matrix
+    row_index = {building: i for i, building in enumerate(buildings)}
+    col_index = {data_type: j for j, data_type in enumerate(STATS_TYPES)}
+    means = np.zeros((len(buildings), len(STATS_TYPES)))
+    found = np.zeros(len(buildings), dtype=bool)
+
+    for table in tables:
+        for record in table.records:
+            i = row_index.get(record.values.get("building"))
+            j = col_index.get(record.values.get("type"))
+            if i is None or j is None or record.get_value() is None:
+                continue
+            means[i, j] = record.get_value()
+            found[i] = True
+
+    scores, statuses = score_buildings(means)
+
     stats = {}
-    
-    for building in buildings:
-        query = f'''
-        from(bucket: "{settings.INFLUXDB_BUCKET}")
-            |> range(start: -{hours}h) 
-            |> filter(fn: (r) => r._measurement == "sensor_data")
-            |> filter(fn: (r) => r.building == "{building}")
-            |> filter(fn: (r) => r.type == "energy" or r.type == "water" or r.type == "co2" or r.type == "occupancy")
-            |> mean()
-            |> pivot(rowKey:["_start"], columnKey: ["type"], valueColumn: "_value")
-        '''
-        
-        try:
-            tables = query_api.query(query)
-            # Defaults in case data is missing
-            building_data = {
-                "energy": 0,
-                "water_usage": 0,
-                "co2_levels": 0,
-                "occupancy": 0
-            }
-            
-            # Process the result (should be just one record after pivot)
-            found_data = False
-            for table in tables:
-                for record in table.records:
-                    found_data = True
-                    # Because of pivot, we access keys directly
-                    building_data["energy"] = record.values.get("energy", 0)
-                    building_data["water_usage"] = record.values.get("water", 0)
-                    building_data["co2_levels"] = record.values.get("co2", 0)
-                    building_data["occupancy"] = record.values.get("occupancy", 0)
-
-            if found_data:
-                # Calculate sustainability score (Example formula: Weighted average)
-                # You can adjust weights: Energy (50%), Water (30%), CO2 (20%)
-                # Normalizing values is tricky without max bounds, so this is a simplified heuristic:
-                
-                energy_score = max(0, 100 - (building_data["energy"] / 5))
-                water_score = max(0, 100 - (building_data["water_usage"] / 10))
-                co2_score = max(0, 100 - ((building_data["co2_levels"] - 400) / 10)) # Baseline 400ppm
-                
-                final_score = (energy_score * 0.5) + (water_score * 0.3) + (co2_score * 0.2)
-
-                stats[building] = {
-                    "building_id": building,
-                    "avg_energy": round(building_data["energy"], 2),
-                    "water_usage": round(building_data["water_usage"], 2),
-                    "co2_levels": round(building_data["co2_levels"], 2),
-                    "occupancy": int(building_data["occupancy"]),
-                    "sustainability_score": round(final_score, 0),
-                    "status": "good" if final_score > 70 else "warning" if final_score > 40 else "critical"
-                }
-            else:
-                # No data found for this building
-                stats[building] = {
-                    "building_id": building,
-                    "avg_energy": 0,
-                    "water_usage": 0,
-                    "co2_levels": 0,
-                    "occupancy": 0,
-                    "sustainability_score": 0,
-                    "status": "unknown"
-                }
-                
-        except Exception as e:
-            print(f"Error getting stats for {building}: {e}")
-            stats[building] = {
-                "building_id": building,
-                "avg_energy": 0,
-                "water_usage": 0,
-                "co2_levels": 0,
-                "occupancy": 0,
-                "sustainability_score": 0,
-                "status": "error"
-            }
-    
-    return stats
\ No newline at end of file
+    for i, building in enumerate(buildings):
+        if not found[i]:
+            # No data found for this building
+            stats[building] = _empty_building_stats(building, "unknown")
+            continue
+
+        stats[building] = building_stats_row(building, means[i], scores[i], statuses[i])
+
+    return stats
@@ -0,0 +1,210 @@
+import asyncio
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class Rollup:
+    """An aggregate bucket holding one mean per series per `seconds`-long window"""
+
+    def __init__(self, name: str, seconds: int, retention_days: int, max_span: timedelta, upstream: "Rollup" = None):
+        self.name = name
+        self.seconds = seconds
+        self.bucket = f"{settings.INFLUXDB_BUCKET}_{name}"
+        # Rollups are chained: each one reads the next finer rollup (or the raw bucket)
+        self.upstream = upstream
+        self.source = upstream.bucket if upstream else settings.INFLUXDB_BUCKET
+        self.retention_days = retention_days
+        # Longest range processed by one Flux call, so backfills stay bounded
+        self.max_span = max_span
+        self.watermark: Optional[datetime] = None      # everything before this has been rolled up
+        self.covered_from: Optional[datetime] = None   # oldest window present in the bucket
+
+    def floor(self, moment: datetime) -> datetime:
+        epoch = int(moment.timestamp())
+        return datetime.fromtimestamp(epoch - epoch % self.seconds, tz=timezone.utc)
+
+    def covers(self, hours: int, now: datetime) -> bool:
+        if self.watermark is None or self.covered_from is None:
+            return False
+        # The open window is never in the rollup; allow two windows of lag
+        if now - self.watermark > timedelta(seconds=2 * self.seconds):
+            return False
+        return self.covered_from <= now - timedelta(hours=hours) + timedelta(seconds=self.seconds)
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "bucket": self.bucket,
+            "source": self.source,
+            "window_seconds": self.seconds,
+            "retention_days": self.retention_days,
+            "watermark": self.watermark.isoformat() if self.watermark else None,
+            "covered_from": self.covered_from.isoformat() if self.covered_from else None,
+        }
+
+
+# Finest first: hourly rolls up raw points, daily rolls up the hourly means
+HOURLY = Rollup("1h", 3600, settings.ROLLUP_HOURLY_RETENTION_DAYS, timedelta(days=1))
+DAILY = Rollup("1d", 86400, settings.ROLLUP_DAILY_RETENTION_DAYS, timedelta(days=60), upstream=HOURLY)
+ROLLUPS: List[Rollup] = [HOURLY, DAILY]
+
+
+def resolve_bucket(hours: int, resolution_seconds: Optional[int] = None) -> str:
+    """Pick the coarsest bucket that still answers a query over the last `hours`.
+
+    A rollup qualifies when its window is no coarser than `resolution_seconds` (None means
+    any resolution is fine, e.g. for window means), the range spans at least
+    ROLLUP_MIN_INTERVALS of its windows, and it is caught up and backfilled far enough.
+    Otherwise the raw bucket is used.
+    """
+    if not settings.ROLLUPS_ENABLED:
+        return settings.INFLUXDB_BUCKET
+
+    now = datetime.now(timezone.utc)
+    for rollup in reversed(ROLLUPS):
+        if resolution_seconds is not None and rollup.seconds > resolution_seconds:
+            continue
+        if hours * 3600 < rollup.seconds * settings.ROLLUP_MIN_INTERVALS:
+            continue
+        if rollup.covers(hours, now):
+            return rollup.bucket
+    return settings.INFLUXDB_BUCKET
+
+
+def _retention_rules(days: int):
+    from influxdb_client import BucketRetentionRules
+    if days <= 0:
+        return []
+    return [BucketRetentionRules(type="expire", every_seconds=days * 86400)]
+
+
+def ensure_rollup_buckets():
+    """Create missing rollup buckets and apply the retention policies"""
+    from app.db import influx_client
+
+    buckets_api = influx_client.client.buckets_api()
+
+    for rollup in ROLLUPS:
+        if buckets_api.find_bucket_by_name(rollup.bucket) is None:
+            buckets_api.create_bucket(
+                bucket_name=rollup.bucket,
+                retention_rules=_retention_rules(rollup.retention_days),
+                org=settings.INFLUXDB_ORG,
+                description=f"{rollup.name} means of {rollup.source}",
+            )
+            logger.info(f"Created rollup bucket {rollup.bucket}")
+
+    if settings.RAW_RETENTION_DAYS > 0:
+        raw = buckets_api.find_bucket_by_name(settings.INFLUXDB_BUCKET)
+        if raw is not None:
+            raw.retention_rules = _retention_rules(settings.RAW_RETENTION_DAYS)
+            buckets_api.update_bucket(bucket=raw)
+
+
+def load_watermarks():
+    """Recover each rollup's progress from the data already in its bucket"""
+    from app.db import influx_client
+
+    now = datetime.now(timezone.utc)
+    for rollup in ROLLUPS:
+        query = f'''
+        from(bucket: "{rollup.bucket}")
+            |> range(start: 0)
+            |> filter(fn: (r) => r._measurement == "sensor_data")
+            |> group()
+            |> reduce(
+                identity: {{first: now(), last: time(v: 0)}},
+                fn: (r, accumulator) => ({{
+                    first: if r._time < accumulator.first then r._time else accumulator.first,
+                    last: if r._time > accumulator.last then r._time else accumulator.last
+                }})
+            )
+        '''
+        tables = influx_client.query_api.query(query, org=settings.INFLUXDB_ORG)
+        records = [record for table in tables for record in table.records]
+        if records:
+            # Rollup points are stamped with the start of their window
+            rollup.covered_from = records[0].values["first"]
+            rollup.watermark = records[0].values["last"] + timedelta(seconds=rollup.seconds)
+        else:
+            rollup.watermark = rollup.floor(now - timedelta(days=settings.ROLLUP_BACKFILL_DAYS))
+            rollup.covered_from = rollup.watermark
+
+
+def run_rollups(now: Optional[datetime] = None) -> Dict[str, int]:
+    """Roll every completed window since the last run into its rollup bucket.
+
+    The trailing ROLLUP_LOOKBACK_WINDOWS windows are rolled up again on every run.
+    Returns how many windows each rollup advanced by.
+    """
+    from app.db import influx_client
+
+    now = now or datetime.now(timezone.utc)
+    advanced = {}
+
+    for rollup in ROLLUPS:
+        if rollup.watermark is None:
+            continue
+        stop = rollup.floor(now)
+        if rollup.upstream:
+            if rollup.upstream.watermark is None:
+                continue
+            # Never summarize upstream windows that have not been written yet
+            stop = min(stop, rollup.floor(rollup.upstream.watermark))
+        previous = rollup.watermark
+        # Re-roll the last few completed windows as well: points that arrive late (write
+        # retries, backfills) land behind the watermark, and rewriting a window is idempotent
+        start = min(previous, stop - timedelta(seconds=rollup.seconds * settings.ROLLUP_LOOKBACK_WINDOWS))
+        start = max(start, rollup.covered_from or start)
+
+        while start < stop:
+            end = min(stop, start + rollup.max_span)
+            query = f'''
+            from(bucket: "{rollup.source}")
+                |> range(start: {start.isoformat()}, stop: {end.isoformat()})
+                |> filter(fn: (r) => r._measurement == "sensor_data")
+                |> aggregateWindow(every: {rollup.seconds}s, fn: mean, createEmpty: false, timeSrc: "_start")
+                |> to(bucket: "{rollup.bucket}", org: "{settings.INFLUXDB_ORG}")
+            '''
+            influx_client.query_api.query(query, org=settings.INFLUXDB_ORG)
+            start = end
+            rollup.watermark = max(rollup.watermark, end)
+
+        advanced[rollup.name] = int((rollup.watermark - previous).total_seconds()) // rollup.seconds
+
+    return advanced
+
+
+async def run_downsampler(interval_seconds: int = 300):
+    """Background loop keeping the rollup buckets up to date"""
+    from app.db.async_access import run_query
+
+    try:
+        await run_query(ensure_rollup_buckets)
+        await run_query(load_watermarks)
+    except Exception as e:
+        print(f"⚠️ Rollups disabled, could not prepare buckets: {e}")
+        return
+
+    while True:
+        try:
+            # Backfills can take a while; give them more than a single query's timeout
+            advanced = await run_query(run_rollups, timeout=settings.INFLUX_QUERY_TIMEOUT * 10)
+            if any(advanced.values()):
+                logger.info(f"Rollups advanced: {advanced}")
+        except Exception as e:
+            print(f"Error in rollup loop: {e}")
+        await asyncio.sleep(interval_seconds)
+
+
+def rollup_status() -> Dict[str, Any]:
+    return {
+        "enabled": settings.ROLLUPS_ENABLED,
+        "raw_bucket": settings.INFLUXDB_BUCKET,
+        "raw_retention_days": settings.RAW_RETENTION_DAYS,
+        "rollups": [rollup.status() for rollup in ROLLUPS],
+    }
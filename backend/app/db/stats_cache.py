@@ -0,0 +1,107 @@
+import threading
+import time
+import logging
+from typing import Callable, Dict, Any
+from app.core.config import settings
+from app.db.influx_client import get_building_stats, add_write_listener
+
+logger = logging.getLogger(__name__)
+
+
+class StatsCache:
+    """TTL cache for campus statistics, keyed by the `hours` window.
+
+    Entries are dropped when new points land in InfluxDB (see `invalidate`). Refreshes are
+    single-flight: concurrent callers for the same window wait on one query instead of
+    each issuing their own.
+    """
+
+    def __init__(self, loader: Callable[[int], Dict[str, Any]], ttl: float):
+        self.loader = loader
+        self.ttl = ttl
+        self._entries: Dict[int, tuple] = {}  # hours -> (value, loaded_at, generation)
+        self._key_locks: Dict[int, threading.Lock] = {}
+        self._lock = threading.Lock()
+        self._generation = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.invalidations = 0
+
+    def _fresh(self, hours: int):
+        entry = self._entries.get(hours)
+        if entry is None:
+            return None
+        value, loaded_at, generation = entry
+        if generation != self._generation or time.monotonic() - loaded_at > self.ttl:
+            return None
+        return value
+
+    def peek(self, hours: int = 24):
+        """Return a fresh cached copy without ever querying, or None"""
+        with self._lock:
+            value = self._fresh(hours)
+            if value is None:
+                return None
+            self.hits += 1
+            return _copy(value)
+
+    def get(self, hours: int = 24) -> Dict[str, Any]:
+        """Return stats for the window, refreshing at most once across concurrent callers"""
+        with self._lock:
+            value = self._fresh(hours)
+            if value is not None:
+                self.hits += 1
+                return _copy(value)
+            key_lock = self._key_locks.setdefault(hours, threading.Lock())
+
+        with key_lock:
+            with self._lock:
+                # Another caller may have refreshed while we were waiting for the key lock
+                value = self._fresh(hours)
+                if value is not None:
+                    self.coalesced += 1
+                    return _copy(value)
+                self.misses += 1
+                generation = self._generation
+
+            value = self.loader(hours)
+
+            # Don't cache failures, and don't store a result that was invalidated mid-query
+            failed = any(b.get("status") == "error" for b in value.values())
+            with self._lock:
+                if not failed and generation == self._generation:
+                    self._entries[hours] = (value, time.monotonic(), generation)
+            return _copy(value)
+
+    def invalidate(self, *_):
+        """Drop every cached window; the next read goes back to InfluxDB"""
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+            self.invalidations += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses + self.coalesced
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+                "invalidations": self.invalidations,
+                "hit_ratio": round((self.hits + self.coalesced) / lookups, 3) if lookups else 0.0,
+                "cached_windows": sorted(self._entries.keys()),
+                "ttl_seconds": self.ttl,
+            }
+
+
+def _copy(stats: Dict[str, Any]) -> Dict[str, Any]:
+    # Callers adjust the per-building dicts in place, so hand out copies
+    return {building: dict(values) for building, values in stats.items()}
+
+
+stats_cache = StatsCache(get_building_stats, ttl=settings.STATS_CACHE_TTL)
+
+# Any batch that lands in InfluxDB (simulation ticks, manual data) makes the cached means stale
+add_write_listener(stats_cache.invalidate)
@@ -0,0 +1,198 @@
+import random
+import threading
+import time
+import logging
+from collections import deque
+from typing import Callable, Deque, Dict, Any, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class BufferedWriter:
+    """Background writer that batches line-protocol records before sending them to InfluxDB.
+
+    Producers call `submit()` with one or more records; a single flusher thread drains the
+    buffer whenever `batch_size` records are pending or `flush_interval` seconds have passed.
+    The buffer is bounded: producers block for up to `backpressure_timeout` seconds when it is
+    full, after which the records are dropped and counted.
+    """
+
+    def __init__(
+        self,
+        write_fn: Callable[[List[str]], None],
+        batch_size: int = 5000,
+        flush_interval: float = 1.0,
+        max_queue_size: int = 100000,
+        max_retries: int = 3,
+        retry_base_delay: float = 0.5,
+        backpressure_timeout: float = 5.0,
+        on_batch_written: Optional[Callable[[int], None]] = None,
+    ):
+        self.write_fn = write_fn
+        self.on_batch_written = on_batch_written
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_queue_size = max_queue_size
+        self.max_retries = max_retries
+        self.retry_base_delay = retry_base_delay
+        self.backpressure_timeout = backpressure_timeout
+
+        self._buffer: Deque[str] = deque()
+        self._cond = threading.Condition()
+        self._in_flight = 0
+        self._flush_requested = False
+        self._running = False
+        self._thread: Optional[threading.Thread] = None
+
+        # Counters exposed through stats()
+        self.points_written = 0
+        self.points_dropped = 0
+        self.points_retried = 0
+        self.batches_written = 0
+        self.batches_failed = 0
+        self.last_batch_latency_ms = 0.0
+        self.max_batch_latency_ms = 0.0
+        self._total_batch_latency_ms = 0.0
+
+    def start(self):
+        with self._cond:
+            if self._running:
+                return
+            self._running = True
+        self._thread = threading.Thread(target=self._run, name="influx-writer", daemon=True)
+        self._thread.start()
+
+    def submit(self, records: List[str], block: bool = True) -> bool:
+        """Queue records for writing. Returns False if they were dropped because the buffer stayed full.
+
+        With block=False a full buffer drops the records at once instead of waiting up to
+        backpressure_timeout, for callers on the event loop.
+        """
+        if not records:
+            return True
+
+        deadline = time.monotonic() + (self.backpressure_timeout if block else 0.0)
+        with self._cond:
+            while len(self._buffer) + len(records) > self.max_queue_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or not self._running:
+                    self.points_dropped += len(records)
+                    logger.warning(f"Write buffer full, dropped {len(records)} points")
+                    return False
+                self._cond.wait(remaining)
+
+            self._buffer.extend(records)
+            if len(self._buffer) >= self.batch_size:
+                self._cond.notify_all()
+        return True
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Block until everything submitted so far has been written (or given up on)."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            if not self._running:
+                # No flusher thread, drain synchronously in the caller
+                while self._buffer:
+                    self._write_batch(self._take_batch())
+                return True
+
+            self._flush_requested = True
+            self._cond.notify_all()
+            while self._buffer or self._in_flight:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+        return True
+
+    def stop(self, timeout: Optional[float] = None):
+        """Flush pending records and stop the flusher thread."""
+        self.flush(timeout)
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+        if self._thread:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            pending = len(self._buffer)
+        return {
+            "pending_points": pending,
+            "points_written": self.points_written,
+            "points_dropped": self.points_dropped,
+            "points_retried": self.points_retried,
+            "batches_written": self.batches_written,
+            "batches_failed": self.batches_failed,
+            "last_batch_latency_ms": round(self.last_batch_latency_ms, 2),
+            "max_batch_latency_ms": round(self.max_batch_latency_ms, 2),
+            "avg_batch_latency_ms": round(self._total_batch_latency_ms / self.batches_written, 2) if self.batches_written else 0.0,
+            "batch_size": self.batch_size,
+            "flush_interval": self.flush_interval,
+            "max_queue_size": self.max_queue_size,
+        }
+
+    def _take_batch(self) -> List[str]:
+        count = min(self.batch_size, len(self._buffer))
+        return [self._buffer.popleft() for _ in range(count)]
+
+    def _run(self):
+        while True:
+            with self._cond:
+                deadline = time.monotonic() + self.flush_interval
+                while self._running and len(self._buffer) < self.batch_size and not self._flush_requested:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+
+                if not self._buffer:
+                    if not self._running:
+                        return
+                    self._flush_requested = False
+                    self._cond.notify_all()
+                    continue
+
+                batch = self._take_batch()
+                self._in_flight = len(batch)
+                # Wake producers waiting on backpressure
+                self._cond.notify_all()
+
+            self._write_batch(batch)
+
+            with self._cond:
+                self._in_flight = 0
+                self._cond.notify_all()
+
+    def _write_batch(self, batch: List[str]):
+        for attempt in range(self.max_retries + 1):
+            started = time.perf_counter()
+            try:
+                self.write_fn(batch)
+            except Exception as e:
+                if attempt == self.max_retries:
+                    self.batches_failed += 1
+                    self.points_dropped += len(batch)
+                    logger.error(f"Giving up on batch of {len(batch)} points after {attempt + 1} attempts: {e}")
+                    return
+                self.points_retried += len(batch)
+                # Exponential backoff with full jitter
+                delay = random.uniform(0, self.retry_base_delay * (2 ** attempt))
+                logger.warning(f"Batch write failed ({e}), retrying in {delay:.2f}s")
+                time.sleep(delay)
+                continue
+
+            latency_ms = (time.perf_counter() - started) * 1000
+            self.points_written += len(batch)
+            self.batches_written += 1
+            self.last_batch_latency_ms = latency_ms
+            self.max_batch_latency_ms = max(self.max_batch_latency_ms, latency_ms)
+            self._total_batch_latency_ms += latency_ms
+            logger.debug(f"Wrote batch of {len(batch)} points in {latency_ms:.1f} ms")
+            if self.on_batch_written:
+                try:
+                    self.on_batch_written(len(batch))
+                except Exception as e:
+                    logger.error(f"Batch listener failed: {e}")
+            return
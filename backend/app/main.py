@@ -3,28 +3,71 @@ from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
 import uvicorn
 import asyncio
+from typing import List
 from app.core.config import settings
-from app.api.endpoints import data, predictions, websocket
-from app.db.influx_client import init_influxdb
+from app.api.endpoints import data, predictions, websocket, events
+from app.db.influx_client import init_influxdb, flush_writes, close_influxdb
 from app.db.influx_client import create_initial_data
+from app.db.async_access import shutdown_executor
+from app.db.rollups import run_downsampler
+from app.realtime.fanout import LeaderElection
 from app.simulation.data_generator import data_generator
 
+# Singleton tasks, run only by the worker holding the leader lease
+leader_tasks: List[asyncio.Task] = []
+
+async def start_leader_tasks():
+    print("👑 Elected leader, starting simulation and background jobs.")
+    leader_tasks.append(asyncio.create_task(run_seeding_in_background()))
+    leader_tasks.append(asyncio.create_task(data_generator.start_continuous_simulation(interval_seconds=300)))
+    leader_tasks.append(asyncio.create_task(websocket.run_producer()))
+    await predictions.close_orphaned_retrain_job()
+    predictions.scheduler.resume_job(predictions.RETRAIN_JOB_ID)
+
+async def stop_leader_tasks():
+    predictions.scheduler.pause_job(predictions.RETRAIN_JOB_ID)
+    # Training jobs run on the leader only
+    if await asyncio.to_thread(predictions.retrain_manager.cancel):
+        print("🛑 Cancelled running model retraining.")
+    data_generator.stop_simulation()
+    for task in leader_tasks:
+        task.cancel()
+    await asyncio.gather(*leader_tasks, return_exceptions=True)
+    leader_tasks.clear()
+    print("✅ Continuous simulation and leader jobs stopped.")
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     print("🚀 Starting application...")
     
     init_influxdb() 
-    seed_task = asyncio.create_task(run_seeding_in_background())
-    sim_task = asyncio.create_task(data_generator.start_continuous_simulation(interval_seconds=300))
+    await websocket.start_realtime()
+    election = LeaderElection(
+        websocket.fanout, "leader", settings.LEADER_LEASE_SECONDS,
+        on_elected=start_leader_tasks, on_demoted=stop_leader_tasks
+    )
+    websocket.leader_election = election
+    election_task = asyncio.create_task(election.run())
     
     print("✅ Port binding in progress, seeding will continue in background.")
     yield
-    data_generator.stop_simulation()
-    sim_task.cancel()
+    election_task.cancel()
     try:
-        await sim_task
+        await election_task
     except asyncio.CancelledError:
-        print("✅ Continuous simulation stopped gracefully.")
+        pass
+    await websocket.stop_realtime()
+    # Don't leave a training process behind; waiting for it to exit must not block the loop
+    if await asyncio.to_thread(predictions.retrain_manager.cancel):
+        print("🛑 Cancelled running model retraining.")
+
+    # Push out anything still sitting in the write buffer before the client goes away
+    if await asyncio.to_thread(flush_writes, 30.0):
+        print("✅ Pending sensor writes flushed.")
+    else:
+        print("⚠️ Timed out flushing pending sensor writes.")
+    shutdown_executor()
+    close_influxdb()
     print("🛑 Application shutdown...")
 
 async def run_seeding_in_background():
@@ -33,6 +76,9 @@ async def run_seeding_in_background():
         print("📊 Initial data seeding completed successfully.")
     except Exception as e:
         print(f"⚠️ Background seeding failed: {e}")
+    # Only roll up once the seeded history is in, so the watermark never passes unwritten windows
+    if settings.ROLLUPS_ENABLED:
+        await run_downsampler(settings.ROLLUP_INTERVAL)
 
 # Create FastAPI app
 app = FastAPI(
@@ -55,6 +101,7 @@ app.add_middleware(
 app.include_router(data.router, prefix=f"{settings.API_V1_STR}/data", tags=["data"])
 app.include_router(predictions.router, prefix=f"{settings.API_V1_STR}/ml", tags=["predictions"])
 app.include_router(websocket.router, prefix=f"{settings.API_V1_STR}/ws", tags=["websocket"])
+app.include_router(events.router, prefix=f"{settings.API_V1_STR}/events", tags=["events"])
 
 @app.get("/")
 async def root():
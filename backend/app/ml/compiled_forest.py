@@ -0,0 +1,295 @@
+import json
+import logging
+import os
+from typing import Any, Dict, Optional
+
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import IsolationForest, RandomForestClassifier, RandomForestRegressor
+
+logger = logging.getLogger(__name__)
+
+REGRESSOR = "regressor"
+CLASSIFIER = "classifier"
+ISOLATION = "isolation"
+
+ARRAYS = ("feature", "threshold", "left", "right", "missing_left", "value", "roots")
+# Bumped whenever ARRAYS or their meaning change, so older exports are rebuilt
+FORMAT_VERSION = 2
+
+
+def average_path_length(n_samples: np.ndarray) -> np.ndarray:
+    """Expected depth of an unsuccessful search in a BST of n samples (same as sklearn's iForest)"""
+    n_samples = np.asarray(n_samples, dtype=np.float64)
+    lengths = np.zeros_like(n_samples)
+    lengths[n_samples == 2] = 1.0
+    deep = n_samples > 2
+    lengths[deep] = 2.0 * (np.log(n_samples[deep] - 1.0) + np.euler_gamma) - 2.0 * (n_samples[deep] - 1.0) / n_samples[deep]
+    return lengths
+
+
+def node_depths(left: np.ndarray, right: np.ndarray) -> np.ndarray:
+    """Depth of every node, counting the root as 1 like sklearn's compute_node_depths"""
+    depths = np.ones(len(left), dtype=np.float64)
+    # sklearn numbers children after their parent, so one forward pass sees every parent first
+    for node in range(len(left)):
+        if left[node] >= 0:
+            depths[left[node]] = depths[node] + 1
+            depths[right[node]] = depths[node] + 1
+    return depths
+
+
+class CompiledForest:
+    """A fitted forest flattened into contiguous node arrays.
+
+    All trees share one set of arrays: `feature`, `threshold`, `left`, `right`,
+    `missing_left` (where a NaN goes, as sklearn decides it) per node and `value` per node (a row of outputs, only meaningful at leaves), with `roots`
+    holding each tree's first node. Leaves point at themselves, so a batch of rows walks
+    every tree at once in `max_depth` vectorized steps with no per-tree Python calls.
+
+    Values are pre-baked per kind: the regression output, the normalised class
+    probabilities, or the isolation path length (depth + expected remainder - 1).
+    """
+
+    def __init__(self, kind: str, arrays: Dict[str, np.ndarray], meta: Dict[str, Any]):
+        self.kind = kind
+        self.arrays = arrays
+        self.meta = meta
+        self.feature = arrays["feature"]
+        self.threshold = arrays["threshold"]
+        self.left = arrays["left"]
+        self.right = arrays["right"]
+        self.missing_left = arrays["missing_left"]
+        self.value = arrays["value"]
+        self.roots = arrays["roots"]
+        self.max_depth = int(meta["max_depth"])
+        self.feature_names_in_ = meta.get("feature_names")
+        self.n_features_in_ = int(meta["n_features"])
+        if kind == CLASSIFIER:
+            self.classes_ = np.asarray(meta["classes"])
+
+    @classmethod
+    def from_estimator(cls, estimator) -> "CompiledForest":
+        if isinstance(estimator, IsolationForest):
+            kind = ISOLATION
+        elif isinstance(estimator, RandomForestClassifier):
+            kind = CLASSIFIER
+        elif isinstance(estimator, RandomForestRegressor):
+            kind = REGRESSOR
+        else:
+            raise TypeError(f"Cannot compile {type(estimator).__name__}")
+        if getattr(estimator, "n_outputs_", 1) != 1:
+            raise TypeError("Only single-output forests are supported")
+
+        features, thresholds, lefts, rights, missing_lefts, values, roots = [], [], [], [], [], [], []
+        offset = 0
+        max_depth = 0
+        # iForest trees are fitted on a column subset; map their indices back to X's columns
+        tree_features = getattr(estimator, "estimators_features_", None) if kind == ISOLATION else None
+        for i, tree_estimator in enumerate(estimator.estimators_):
+            tree = tree_estimator.tree_
+            left = tree.children_left.astype(np.int32)
+            right = tree.children_right.astype(np.int32)
+            is_leaf = left < 0
+            node_ids = np.arange(tree.node_count, dtype=np.int32)
+
+            feature = tree.feature.astype(np.int32)
+            if tree_features is not None:
+                feature = np.asarray(tree_features[i], dtype=np.int32)[np.where(is_leaf, 0, feature)]
+            feature[is_leaf] = 0
+
+            threshold = tree.threshold.astype(np.float64)
+            threshold[is_leaf] = np.inf
+
+            # Older sklearn has no missing-value support: NaN fails `<=` and goes right
+            missing_left = getattr(tree, "missing_go_to_left", None)
+            missing_left = np.zeros(tree.node_count, dtype=bool) if missing_left is None else missing_left.astype(bool)
+            missing_left[is_leaf] = False
+
+            if kind == REGRESSOR:
+                value = tree.value[:, 0, :1].astype(np.float64)
+            elif kind == CLASSIFIER:
+                value = tree.value[:, 0, :].astype(np.float64)
+                totals = value.sum(axis=1, keepdims=True)
+                totals[totals == 0.0] = 1.0
+                value = value / totals
+            else:
+                depth = node_depths(left, right)
+                value = (depth + average_path_length(tree.n_node_samples) - 1.0)[:, None]
+
+            features.append(feature)
+            thresholds.append(threshold)
+            lefts.append(np.where(is_leaf, node_ids, left) + offset)
+            rights.append(np.where(is_leaf, node_ids, right) + offset)
+            missing_lefts.append(missing_left)
+            values.append(value)
+            roots.append(offset)
+            offset += tree.node_count
+            max_depth = max(max_depth, tree.max_depth)
+
+        arrays = {
+            "feature": np.ascontiguousarray(np.concatenate(features), dtype=np.int32),
+            "threshold": np.ascontiguousarray(np.concatenate(thresholds)),
+            "left": np.ascontiguousarray(np.concatenate(lefts), dtype=np.int32),
+            "right": np.ascontiguousarray(np.concatenate(rights), dtype=np.int32),
+            "missing_left": np.ascontiguousarray(np.concatenate(missing_lefts), dtype=bool),
+            "value": np.ascontiguousarray(np.concatenate(values)),
+            "roots": np.asarray(roots, dtype=np.int32),
+        }
+        names = getattr(estimator, "feature_names_in_", None)
+        meta = {
+            "estimator": type(estimator).__name__,
+            "max_depth": max_depth,
+            "n_features": estimator.n_features_in_,
+            "feature_names": list(names) if names is not None else None,
+        }
+        if kind == CLASSIFIER:
+            meta["classes"] = estimator.classes_.tolist()
+        if kind == ISOLATION:
+            meta["offset"] = float(estimator.offset_)
+            meta["path_length_norm"] = float(average_path_length([estimator._max_samples])[0])
+        return cls(kind, arrays, meta)
+
+    def save(self, directory: str):
+        """One .npy per array plus meta.json, the layout `load` can memory-map"""
+        os.makedirs(directory, exist_ok=True)
+        for name in ARRAYS:
+            np.save(os.path.join(directory, f"{name}.npy"), self.arrays[name])
+        with open(os.path.join(directory, "meta.json"), "w") as f:
+            json.dump({"kind": self.kind, **self.meta}, f)
+
+    @classmethod
+    def load(cls, directory: str, mmap_mode: Optional[str] = "r") -> "CompiledForest":
+        with open(os.path.join(directory, "meta.json")) as f:
+            meta = json.load(f)
+        kind = meta.pop("kind")
+        # Plain ndarray views over the maps, so indexing doesn't go through np.memmap
+        arrays = {name: np.asarray(np.load(os.path.join(directory, f"{name}.npy"), mmap_mode=mmap_mode)) for name in ARRAYS}
+        return cls(kind, arrays, meta)
+
+    def _matrix(self, X) -> np.ndarray:
+        if isinstance(X, pd.DataFrame) and self.feature_names_in_ is not None:
+            X = X[self.feature_names_in_]
+        # sklearn compares float32 inputs against float64 thresholds; do the same for parity
+        X = np.asarray(X, dtype=np.float32)
+        if X.ndim != 2 or X.shape[1] != self.n_features_in_:
+            raise ValueError(f"Expected {self.n_features_in_} features, got shape {X.shape}")
+        return X
+
+    def apply(self, X) -> np.ndarray:
+        """Leaf index reached in every tree, shape (n_samples, n_trees)"""
+        X = self._matrix(X)
+        rows = np.arange(X.shape[0])[:, None]
+        nodes = np.broadcast_to(self.roots, (X.shape[0], len(self.roots)))
+        has_missing = bool(np.isnan(X).any())
+        for _ in range(self.max_depth):
+            values = X[rows, self.feature[nodes]]
+            go_left = values <= self.threshold[nodes]
+            if has_missing:
+                go_left |= np.isnan(values) & self.missing_left[nodes]
+            nodes = np.where(go_left, self.left[nodes], self.right[nodes])
+        return nodes
+
+    def _leaf_sum(self, X) -> np.ndarray:
+        leaves = self.apply(X)
+        # Accumulate tree by tree, in sklearn's order, so the float sums match exactly
+        total = np.zeros((leaves.shape[0], self.value.shape[1]))
+        for tree in range(leaves.shape[1]):
+            total += self.value[leaves[:, tree]]
+        return total
+
+    def predict_proba(self, X) -> np.ndarray:
+        if self.kind != CLASSIFIER:
+            raise AttributeError("predict_proba is only available for classifiers")
+        return self._leaf_sum(X) / len(self.roots)
+
+    def score_samples(self, X) -> np.ndarray:
+        if self.kind != ISOLATION:
+            raise AttributeError("score_samples is only available for isolation forests")
+        denominator = len(self.roots) * self.meta["path_length_norm"]
+        if denominator == 0:
+            return -np.ones(len(X))
+        return -(2 ** (-self._leaf_sum(X)[:, 0] / denominator))
+
+    def decision_function(self, X) -> np.ndarray:
+        return self.score_samples(X) - self.meta["offset"]
+
+    def predict(self, X) -> np.ndarray:
+        if self.kind == REGRESSOR:
+            return self._leaf_sum(X)[:, 0] / len(self.roots)
+        if self.kind == CLASSIFIER:
+            return self.classes_.take(np.argmax(self.predict_proba(X), axis=1))
+        return np.where(self.decision_function(X) < 0, -1, 1)
+
+    def nbytes(self) -> int:
+        return sum(array.nbytes for array in self.arrays.values())
+
+
+def probe_inputs(compiled: CompiledForest, n_random: int = 256, max_edges: int = 2048, seed: int = 0) -> np.ndarray:
+    """Rows sitting on and just above split thresholds, random points around them, and
+    copies of those random points with some features missing (NaN)"""
+    rng = np.random.default_rng(seed)
+    n_features = compiled.n_features_in_
+    is_split = compiled.left != np.arange(len(compiled.left))
+    columns = []
+    for column in range(n_features):
+        thresholds = np.unique(compiled.threshold[is_split & (compiled.feature == column)])
+        if len(thresholds) == 0:
+            thresholds = np.zeros(1)
+        low, high = thresholds.min(), thresholds.max()
+        span = max(high - low, 1.0)
+        edges = np.concatenate([thresholds, np.nextafter(thresholds.astype(np.float32), np.float32(np.inf))])
+        if len(edges) > max_edges:
+            edges = rng.choice(edges, max_edges, replace=False)
+        spread = rng.uniform(low - 0.1 * span, high + 0.1 * span, n_random)
+        columns.append((edges, spread))
+
+    n_edges = max(len(edges) for edges, _ in columns)
+    X = np.empty((n_edges + n_random, n_features))
+    for column, (edges, spread) in enumerate(columns):
+        # Columns with fewer distinct thresholds repeat them to fill the edge rows
+        edge_rows = edges if len(edges) == n_edges else rng.choice(edges, n_edges)
+        X[:, column] = np.concatenate([edge_rows, spread])
+    missing = X[n_edges:].copy()
+    missing[rng.random(missing.shape) < 0.3] = np.nan
+    return np.vstack([X, missing])
+
+
+def check_parity(compiled: CompiledForest, estimator, X: np.ndarray) -> Optional[str]:
+    """Compare against sklearn on X; returns a description of the first mismatch, or None"""
+    frame = pd.DataFrame(X, columns=compiled.feature_names_in_) if compiled.feature_names_in_ is not None else X
+    if compiled.kind == REGRESSOR:
+        pairs = [("predict", compiled.predict(frame), estimator.predict(frame))]
+    elif compiled.kind == CLASSIFIER:
+        pairs = [("predict_proba", compiled.predict_proba(frame), estimator.predict_proba(frame))]
+    else:
+        pairs = [("score_samples", compiled.score_samples(frame), estimator.score_samples(frame))]
+    pairs.append(("predict", compiled.predict(frame), estimator.predict(frame)))
+
+    for name, ours, theirs in pairs:
+        if ours.shape != theirs.shape:
+            return f"{name} shape {ours.shape} != {theirs.shape}"
+        if not np.allclose(ours, theirs, rtol=1e-9, atol=1e-12):
+            worst = int(np.argmax(np.abs(np.asarray(ours, dtype=float) - np.asarray(theirs, dtype=float))))
+            return f"{name} differs on row {worst}: {ours[worst]} != {theirs[worst]}"
+    return None
+
+
+def compile_model(estimator, name: str = "model"):
+    """Compile a fitted forest for inference, or return the estimator untouched.
+
+    The compiled forest is checked against sklearn on probe rows covering every split
+    threshold; any unsupported model or mismatch keeps serving the original estimator.
+    """
+    if estimator is None:
+        return None
+    try:
+        compiled = CompiledForest.from_estimator(estimator)
+        mismatch = check_parity(compiled, estimator, probe_inputs(compiled))
+    except Exception as e:
+        logger.warning(f"Not compiling {name}: {e}")
+        return estimator
+    if mismatch:
+        logger.warning(f"Compiled {name} does not match sklearn ({mismatch}); using sklearn")
+        return estimator
+    return compiled
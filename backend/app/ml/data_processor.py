@@ -2,7 +2,8 @@ import numpy as np
 import pandas as pd
 from datetime import datetime, timedelta
 from typing import List, Dict, Any
-from app.db.influx_client import query_sensor_data
+from app.db.influx_client import query_sensor_columns
+from app.db.async_access import run_query
 
 class DataProcessor:
     """Processes and prepares data for ML models"""
@@ -11,19 +12,19 @@ class DataProcessor:
     def get_historical_series(building_id: str, data_type: str, hours: int = 168) -> List[float]:
         """Get historical time series data for a building"""
         try:
-            data = query_sensor_data(building_id, data_type, hours, limit=10000)
+            # Hourly means computed in InfluxDB (served from the hourly rollup on long ranges)
+            series = query_sensor_columns(building_id, data_type, hours, limit=10000, every=3600)
             
-            if not data:
+            if not series:
                 return []
             
-            # Convert to pandas for processing
-            df = pd.DataFrame(data)
-            df['time'] = pd.to_datetime(df['time'])
-            df = df.sort_values('time')
+            # Build the pandas series straight from the columnar arrays
+            times = np.concatenate([s['times'] for s in series])
+            values = np.concatenate([s['values'] for s in series])
+            ts = pd.Series(values, index=pd.to_datetime(times, unit='ms', utc=True)).sort_index()
             
             # Resample to hourly data if needed
-            df.set_index('time', inplace=True)
-            hourly_data = df['value'].resample('1H').mean()
+            hourly_data = ts.resample('1h').mean()
             
             # Fill missing values
             hourly_data = hourly_data.interpolate(method='linear')
@@ -34,6 +35,11 @@ class DataProcessor:
             print(f"Error getting historical series: {e}")
             return []
     
+    @staticmethod
+    async def get_historical_series_async(building_id: str, data_type: str, hours: int = 168) -> List[float]:
+        """Non-blocking variant of get_historical_series for request handlers"""
+        return await run_query(DataProcessor.get_historical_series, building_id, data_type, hours)
+    
     @staticmethod
     def get_multiple_series(building_ids: List[str], data_type: str, hours: int = 168) -> Dict[str, List[float]]:
         """Get historical data for multiple buildings"""
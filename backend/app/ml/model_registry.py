@@ -0,0 +1,153 @@
+import logging
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from typing import Any, Callable, Deque, Dict, Iterable, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from app.ml.model_store import ModelStore, resident_bytes
+
+logger = logging.getLogger(__name__)
+
+
+class ModelSet:
+    """One immutable version of every model, as seen by the requests that use it.
+
+    The set pins a version of each model's pickle when it is created (see ModelStore.pin),
+    so a set never mixes models from two trainings, and a model loaded later, e.g. after a
+    rollback, is still this set's version even if the models were retrained meanwhile.
+    """
+
+    def __init__(self, version: int, store: ModelStore, names: Iterable[str]):
+        self.version = version
+        self.store = store
+        self.fingerprints = {name: store.pin(name) for name in names}
+        self.models: Dict[str, Any] = {}
+        self.info: Dict[str, Dict[str, Any]] = {}
+        self.lock = threading.Lock()
+        self.created_at = datetime.now()
+        self.warmed_at: Optional[datetime] = None
+        self.warm_seconds: Optional[float] = None
+
+    def available(self, name: str) -> bool:
+        return self.fingerprints.get(name) is not None
+
+    def is_loaded(self, name: str) -> bool:
+        return name in self.models
+
+    def get(self, name: str):
+        """The model called `name`, loading it on first use; None if this set doesn't have it"""
+        model = self.models.get(name)
+        if model is not None or not self.available(name):
+            return model
+        with self.lock:
+            if name not in self.models:
+                try:
+                    self.models[name], self.info[name] = self.store.load(name, self.fingerprints[name])
+                except FileNotFoundError as e:
+                    logger.warning(f"Model set v{self.version} cannot load {name}: {e}")
+                    self.fingerprints[name] = None
+                    return None
+            return self.models[name]
+
+    def warm(self, rows: int = 64, seed: int = 0):
+        """Load every model and run synthetic predictions through it, off the request path"""
+        start = time.perf_counter()
+        rng = np.random.default_rng(seed)
+        for name in self.fingerprints:
+            model = self.get(name)
+            if model is None:
+                continue
+            columns = getattr(model, "feature_names_in_", None)
+            X = rng.normal(size=(rows, model.n_features_in_)) * 100
+            model.predict(pd.DataFrame(X, columns=list(columns)) if columns is not None else X)
+        self.warm_seconds = round(time.perf_counter() - start, 4)
+        self.warmed_at = datetime.now()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "version": self.version,
+            "created_at": self.created_at.isoformat(),
+            "warmed_at": self.warmed_at.isoformat() if self.warmed_at else None,
+            "warm_seconds": self.warm_seconds,
+            "models": {
+                name: {
+                    "available": fingerprint is not None,
+                    "loaded": name in self.info,
+                    **{key: value for key, value in self.info.get(name, {}).items() if key != "directory"},
+                    "resident_bytes": resident_bytes(self.info[name]["directory"]) if self.info.get(name, {}).get("directory") else None,
+                }
+                for name, fingerprint in self.fingerprints.items()
+            },
+        }
+
+
+class ModelRegistry:
+    """Versioned model sets with one serving set and a short history for rollback.
+
+    Readers take `registry.current` once per request and use that set throughout;
+    publishing replaces it with a single reference assignment, so a request sees either
+    the old set or the new one, never a mix. New sets are built and warmed before they
+    are published.
+    """
+
+    def __init__(self, store: ModelStore, names: Iterable[str], history: int = 2):
+        self.store = store
+        self.names = list(names)
+        self.history: Deque[ModelSet] = deque(maxlen=history)
+        self.lock = threading.Lock()
+        self.last_version = 0
+        self.current = self.build()
+
+    def build(self) -> ModelSet:
+        """A new set over the models currently on disk, not yet serving"""
+        with self.lock:
+            self.last_version += 1
+            return ModelSet(self.last_version, self.store, self.names)
+
+    def publish(self, model_set: ModelSet, prepare: Callable[[ModelSet], None] = None) -> ModelSet:
+        """Make `model_set` the serving set; `prepare` runs first, e.g. to warm caches for it"""
+        if prepare:
+            prepare(model_set)
+        with self.lock:
+            previous = self.current
+            retained = [s for s in self.history if s is not model_set]
+            if previous is not model_set:
+                retained.append(previous)
+            self.history = deque(retained, maxlen=self.history.maxlen)
+            self.current = model_set
+        logger.info(f"Serving model set v{model_set.version} (was v{previous.version})")
+        self.prune()
+        return previous
+
+    def prune(self):
+        """Drop model versions on disk that neither the serving set nor the history uses"""
+        with self.lock:
+            sets = [self.current, *self.history]
+        referenced = {name: {s.fingerprints[name] for s in sets if s.fingerprints.get(name)} for name in self.names}
+        try:
+            self.store.prune(self.names, referenced, keep=self.history.maxlen + 1)
+        except OSError as e:
+            logger.warning(f"Could not prune old model versions: {e}")
+
+    def rollback(self, version: Optional[int] = None, prepare: Callable[[ModelSet], None] = None) -> ModelSet:
+        """Serve a previous set again: `version`, or the most recent one"""
+        with self.lock:
+            candidates = [s for s in self.history if version is None or s.version == version]
+        if not candidates:
+            raise KeyError(version)
+        self.publish(candidates[-1], prepare)
+        return candidates[-1]
+
+    def versions(self) -> List[int]:
+        return [self.current.version, *(s.version for s in self.history)]
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "serving_version": self.current.version,
+            "serving": self.current.stats(),
+            "rollback_versions": [s.version for s in reversed(self.history)],
+        }
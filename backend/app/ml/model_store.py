@@ -0,0 +1,162 @@
+import glob
+import logging
+import os
+import shutil
+import time
+import uuid
+from typing import Any, Dict, Iterable, Optional, Set, Tuple
+
+import joblib
+
+from app.ml.compiled_forest import FORMAT_VERSION, CompiledForest, compile_model
+
+logger = logging.getLogger(__name__)
+
+COMPILED_DIR = "compiled"
+VERSIONS_DIR = "versions"
+
+
+def file_fingerprint(path: str) -> str:
+    stat = os.stat(path)
+    return f"{stat.st_mtime_ns:x}-{stat.st_size:x}"
+
+
+def resident_bytes(directory: str) -> Optional[int]:
+    """Bytes of files under `directory` currently resident in this process (Linux only)"""
+    prefix = os.path.abspath(directory) + os.sep
+    total = 0
+    try:
+        with open("/proc/self/smaps") as f:
+            mapped = False
+            for line in f:
+                head = line.split(None, 5)
+                if "-" in head[0] and not head[0].endswith(":"):
+                    # Mapping header: "start-end perms offset dev inode [path]"
+                    mapped = len(head) == 6 and head[5].strip().startswith(prefix)
+                elif mapped and head[0] == "Rss:":
+                    total += int(head[1]) * 1024
+    except OSError:
+        return None
+    return total
+
+
+class ModelStore:
+    """Reads the pickled models under one directory, sharing them between workers.
+
+    Models are loaded from pinned versions rather than the live `<name>.pkl`: `pin` hard
+    links the current pickle to `versions/<name>-<fingerprint>.pkl`, which a retrain
+    never touches (it renames a new file over the live path), so a model set can still
+    load its own version after the models were retrained. The fingerprint is the
+    pickle's mtime and size.
+
+    The first load of a version compiles it once into `compiled/<name>-<fingerprint>-v<format>/`
+    (one .npy per node array, see CompiledForest.save) and every process memory-maps
+    those files read-only, so workers share the same pages through the OS page cache
+    instead of each unpickling a private copy. Models that don't compile are served from
+    the pickle as before. Which loaded models are in use is up to the caller (see
+    ModelSet); `prune` drops the versions no longer needed.
+    """
+
+    def __init__(self, root: str, compile: bool = True):
+        self.root = root
+        self.compile = compile
+
+    def source(self, name: str) -> str:
+        return os.path.join(self.root, f"{name}.pkl")
+
+    def version(self, name: str, fingerprint: str) -> str:
+        return os.path.join(self.root, VERSIONS_DIR, f"{name}-{fingerprint}.pkl")
+
+    def compiled(self, name: str, fingerprint: str) -> str:
+        return os.path.join(self.root, COMPILED_DIR, f"{name}-{fingerprint}-v{FORMAT_VERSION}")
+
+    def pin(self, name: str) -> Optional[str]:
+        """Keep the current pickle of `name` as an immutable version; returns its fingerprint,
+        or None if the model hasn't been trained"""
+        os.makedirs(os.path.join(self.root, VERSIONS_DIR), exist_ok=True)
+        staging = os.path.join(self.root, VERSIONS_DIR, f"{name}.{uuid.uuid4().hex}.tmp")
+        try:
+            try:
+                os.link(self.source(name), staging)
+            except FileNotFoundError:
+                return None
+            except OSError:
+                # No hard links on this filesystem
+                shutil.copy2(self.source(name), staging)
+            # Fingerprint the linked file itself, so a concurrent retrain can't mix two pickles
+            fingerprint = file_fingerprint(staging)
+            os.replace(staging, self.version(name, fingerprint))
+        except FileNotFoundError:
+            return None
+        finally:
+            if os.path.exists(staging):
+                os.remove(staging)
+        return fingerprint
+
+    def load(self, name: str, fingerprint: str) -> Tuple[Any, Dict[str, Any]]:
+        """Load version `fingerprint` of `name` and describe how"""
+        start = time.perf_counter()
+        source = self.version(name, fingerprint)
+        if not os.path.exists(source):
+            raise FileNotFoundError(f"{name} version {fingerprint} is no longer on disk")
+
+        directory = self.compiled(name, fingerprint)
+        if not self.compile:
+            model = joblib.load(source)
+        elif os.path.isdir(directory):
+            model = CompiledForest.load(directory)
+        else:
+            model = self._export(name, source, directory)
+
+        compiled = isinstance(model, CompiledForest)
+        info = {
+            "engine": "mmap" if compiled else "pickle",
+            "type": model.meta["estimator"] if compiled else type(model).__name__,
+            "fingerprint": fingerprint,
+            "load_seconds": round(time.perf_counter() - start, 4),
+            "mapped_bytes": model.nbytes() if compiled else None,
+            "file_bytes": os.path.getsize(source),
+            "directory": directory if compiled else None,
+        }
+        logger.info(f"Loaded {name} ({info['engine']}) in {info['load_seconds']}s")
+        return model, info
+
+    def _export(self, name: str, source: str, directory: str):
+        estimator = joblib.load(source)
+        compiled = compile_model(estimator, name)
+        if not isinstance(compiled, CompiledForest):
+            return estimator
+
+        # Build under a private name and rename into place, so other workers never map a partial export
+        staging = f"{directory}.{os.getpid()}.tmp"
+        compiled.save(staging)
+        try:
+            os.rename(staging, directory)
+        except OSError:
+            # Another worker exported the same pickle first
+            shutil.rmtree(staging, ignore_errors=True)
+
+        # Drop the heap copy and serve from the shared map like every other worker
+        return CompiledForest.load(directory)
+
+    def prune(self, names: Iterable[str], referenced: Dict[str, Set[str]], keep: int):
+        """Delete pinned versions and compiled exports that are no longer needed.
+
+        For each model the `keep` newest versions survive (other workers retain the same
+        sets as this one), plus any version in `referenced`. Processes still mapping a
+        deleted export keep its pages until they drop the model.
+        """
+        for name in names:
+            pinned = glob.glob(os.path.join(self.root, VERSIONS_DIR, f"{name}-*.pkl"))
+            pinned.sort(key=os.path.getmtime, reverse=True)
+            kept = set()
+            for newest, path in enumerate(pinned):
+                fingerprint = os.path.basename(path)[len(name) + 1:-len(".pkl")]
+                if newest < keep or fingerprint in referenced.get(name, ()):
+                    kept.add(fingerprint)
+                else:
+                    os.remove(path)
+            exports = {self.compiled(name, fingerprint) for fingerprint in kept}
+            for directory in glob.glob(os.path.join(self.root, COMPILED_DIR, f"{name}-*")):
+                if directory not in exports and not directory.endswith(".tmp"):
+                    shutil.rmtree(directory, ignore_errors=True)
@@ -0,0 +1,218 @@
+import json
+import logging
+import os
+import shutil
+import subprocess
+import sys
+import threading
+import uuid
+from datetime import datetime
+from typing import Any, Callable, Dict, Optional
+
+try:
+    import resource
+except ImportError:  # Unix only; elsewhere the worker runs without rlimits
+    resource = None
+
+logger = logging.getLogger(__name__)
+
+STAGING_DIR = "staging"
+
+# Job states
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+
+def apply_limits(limits: Dict[str, int]):
+    """Constrain the current process: address space, CPU time, cores and priority"""
+    if resource:
+        if limits.get("memory_mb"):
+            size = limits["memory_mb"] * 1024 * 1024
+            resource.setrlimit(resource.RLIMIT_AS, (size, size))
+        if limits.get("cpu_seconds"):
+            # SIGXCPU at the soft limit, SIGKILL a little later if it is ignored
+            resource.setrlimit(resource.RLIMIT_CPU, (limits["cpu_seconds"], limits["cpu_seconds"] + 30))
+    if limits.get("cpus") and hasattr(os, "sched_setaffinity"):
+        cores = sorted(os.sched_getaffinity(0))
+        # Take the last cores, leaving the first ones to the API's event loop
+        os.sched_setaffinity(0, cores[-limits["cpus"]:])
+    if limits.get("nice"):
+        os.nice(limits["nice"])
+
+
+def describe(job: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """A job's public status, with the elapsed time of a running job"""
+    if job is None:
+        return None
+    status = dict(job)
+    if job["state"] == RUNNING:
+        status["elapsed_seconds"] = round((datetime.now() - datetime.fromisoformat(job["started_at"])).total_seconds(), 1)
+    return status
+
+
+def run_worker(output_dir: str, limits: Dict[str, int]):
+    """Entry point of the training process: train into `output_dir` and report on stdout.
+
+    Events are JSON lines on the original stdout; the pipeline's own prints go to stderr.
+    """
+    events = os.fdopen(os.dup(sys.stdout.fileno()), "w", buffering=1)
+    os.dup2(sys.stderr.fileno(), sys.stdout.fileno())
+
+    def emit(event: Dict[str, Any]):
+        events.write(json.dumps(event) + "\n")
+
+    apply_limits(limits)
+    # Imported here so the API process never loads the training code
+    from scripts.train_ml import run_training_pipeline
+
+    def progress(stage: str, fraction: float):
+        emit({"stage": stage, "progress": round(fraction, 3)})
+
+    try:
+        # One stage or estimator job per core the worker was given
+        success = run_training_pipeline(output_dir=output_dir, progress=progress, n_jobs=limits.get("cpus") or None)
+    except MemoryError:
+        emit({"error": f"Training exceeded the {limits.get('memory_mb')} MB memory limit"})
+        return
+    except Exception as e:
+        emit({"error": f"Training failed: {e}"})
+        return
+    if not success:
+        emit({"error": "Training aborted, see the worker log"})
+        return
+    report_path = os.path.join(output_dir, "training_report.json")
+    report = None
+    if os.path.exists(report_path):
+        with open(report_path) as f:
+            report = json.load(f)
+    emit({"artifacts": sorted(f for f in os.listdir(output_dir) if f.endswith(".pkl")), "report": report})
+
+
+class RetrainManager:
+    """Runs model training in a separate, resource-limited process, one job at a time.
+
+    The worker is a fresh interpreter per job (`python -m app.ml.retrain_worker`), so
+    training never shares the API's GIL or heap and a crash or rlimit kill only ends that
+    job. It trains into a private staging directory and reports progress as JSON lines on
+    its stdout; only when it reports its artifacts does this process move the finished
+    pickles into the model directory and call `on_complete` (which publishes them as a
+    new model set). `on_change` receives the job's status whenever it changes, e.g. to
+    share it with other API workers.
+    """
+
+    def __init__(self, model_dir: str, limits: Dict[str, int], on_complete: Callable[[], Any] = None,
+                 on_change: Callable[[Dict[str, Any]], Any] = None):
+        self.model_dir = model_dir
+        self.limits = limits
+        self.on_complete = on_complete
+        self.on_change = on_change
+        self.lock = threading.Lock()
+        self.process = None
+        self.job: Optional[Dict[str, Any]] = None
+
+    def running(self) -> bool:
+        return self.job is not None and self.job["state"] == RUNNING
+
+    def start(self, trigger: str = "manual") -> Dict[str, Any]:
+        """Start a training job; raises RuntimeError while another one is running"""
+        with self.lock:
+            if self.running():
+                raise RuntimeError(f"Retrain job {self.job['id']} is already running")
+            job_id = uuid.uuid4().hex[:12]
+            staging = os.path.join(self.model_dir, STAGING_DIR, job_id)
+            os.makedirs(staging, exist_ok=True)
+            process = subprocess.Popen(
+                [sys.executable, "-m", "app.ml.retrain_worker", staging, json.dumps(self.limits)],
+                stdout=subprocess.PIPE,
+                text=True,
+            )
+            self.process = process
+            self.job = {
+                "id": job_id,
+                "trigger": trigger,
+                "state": RUNNING,
+                "stage": "starting",
+                "progress": 0.0,
+                "pid": process.pid,
+                "limits": self.limits,
+                "started_at": datetime.now().isoformat(),
+                "finished_at": None,
+                "error": None,
+                "artifacts": [],
+                "report": None,
+                "model_version": None,
+            }
+            job = self.job
+        self._changed(job)
+        threading.Thread(target=self._monitor, args=(job, process, staging), daemon=True).start()
+        return dict(job)
+
+    def cancel(self) -> Optional[Dict[str, Any]]:
+        """Stop the running job, if any; its partial output is discarded"""
+        with self.lock:
+            if not self.running():
+                return None
+            self.job["state"] = CANCELLED
+            process = self.process
+        process.terminate()
+        try:
+            process.wait(10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+        return self.status()
+
+    def status(self) -> Optional[Dict[str, Any]]:
+        return describe(self.job)
+
+    def _changed(self, job: Dict[str, Any]):
+        if self.on_change:
+            try:
+                self.on_change(dict(job))
+            except Exception as e:
+                logger.warning(f"Could not report retrain job {job['id']}: {e}")
+
+    def _monitor(self, job: Dict[str, Any], process, staging: str):
+        outcome = None
+        for line in process.stdout:
+            try:
+                event = json.loads(line)
+            except ValueError:
+                continue
+            if "stage" in event:
+                job.update(event)
+                self._changed(job)
+            else:
+                outcome = event
+        code = process.wait()
+        if outcome is None:
+            outcome = {"error": f"Worker exited with code {code}"}
+
+        try:
+            if job["state"] == CANCELLED:
+                return
+            if "error" in outcome:
+                job.update(state=FAILED, error=outcome["error"])
+                logger.error(f"Retrain job {job['id']} failed: {outcome['error']}")
+                return
+
+            # Each rename is atomic, so readers see either the old or the new pickle
+            for artifact in outcome["artifacts"]:
+                os.replace(os.path.join(staging, artifact), os.path.join(self.model_dir, artifact))
+            job.update(stage="publishing", progress=1.0, artifacts=outcome["artifacts"], report=outcome.get("report"))
+            if self.on_complete:
+                published = self.on_complete()
+                job["model_version"] = getattr(published, "version", None)
+            job["state"] = SUCCEEDED
+        except Exception as e:
+            job.update(state=FAILED, error=f"Installing models failed: {e}")
+            logger.error(f"Retrain job {job['id']} could not be installed: {e}")
+        finally:
+            shutil.rmtree(staging, ignore_errors=True)
+            job["finished_at"] = datetime.now().isoformat()
+            self._changed(job)
+
+
+if __name__ == "__main__":
+    run_worker(sys.argv[1], json.loads(sys.argv[2]))
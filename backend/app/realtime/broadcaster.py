@@ -0,0 +1,158 @@
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, Iterable, List
+import numpy as np
+from fastapi import WebSocket
+from app.realtime.codec import JSON, encode
+
+logger = logging.getLogger(__name__)
+
+
+class Client:
+    """A connected socket with its own bounded outbound queue and sender task"""
+
+    def __init__(self, websocket: WebSocket, queue_size: int, encoding: str = JSON):
+        self.websocket = websocket
+        self.encoding = encoding
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.sender: asyncio.Task = None
+        self.connected_at = time.time()
+        self.sent = 0
+
+
+class ConnectionManager:
+    """Fan-out broadcaster for WebSocket clients.
+
+    A message is serialized once (per negotiated encoding) and handed to every client's outbound queue
+    without awaiting any socket, so one stalled client cannot delay the others. Each client
+    has a sender task that writes with a timeout; clients whose queue fills up or whose
+    send times out are evicted.
+    """
+
+    def __init__(self, queue_size: int = 32, send_timeout: float = 5.0, latency_samples: int = 10000):
+        self.clients: Dict[WebSocket, Client] = {}
+        self.queue_size = queue_size
+        self.send_timeout = send_timeout
+
+        # Time from broadcast() to the frame being written, per delivery
+        self.latencies: Deque[float] = deque(maxlen=latency_samples)
+        self.broadcasts = 0
+        self.messages_sent = 0
+        self.evictions = 0
+        self.disconnect_listeners: List[Callable[[WebSocket], None]] = []
+
+    @property
+    def active_connections(self) -> List[WebSocket]:
+        return list(self.clients)
+
+    async def connect(self, websocket: WebSocket, encoding: str = JSON, subprotocol: str = None):
+        await websocket.accept(subprotocol=subprotocol)
+        client = Client(websocket, self.queue_size, encoding)
+        client.sender = asyncio.create_task(self._sender(client))
+        self.clients[websocket] = client
+        logger.debug(f"New WebSocket connection. Total: {len(self.clients)}")
+
+    def disconnect(self, websocket: WebSocket):
+        client = self.clients.pop(websocket, None)
+        if client is None:
+            return
+        if client.sender and client.sender is not asyncio.current_task():
+            client.sender.cancel()
+        for listener in self.disconnect_listeners:
+            listener(websocket)
+        logger.debug(f"WebSocket disconnected. Total: {len(self.clients)}")
+
+    def send_message(self, websocket: WebSocket, payload: Dict[str, Any]) -> bool:
+        """Encode a message in the client's negotiated encoding and queue it"""
+        client = self.clients.get(websocket)
+        if client is None:
+            return False
+        return self._enqueue(client, encode(payload, client.encoding), time.perf_counter())
+
+    async def broadcast_message(self, payload: Dict[str, Any], websockets: Iterable[WebSocket] = None):
+        """Queue a message for some (default: all) clients, encoded once per negotiated encoding"""
+        self.broadcasts += 1
+        enqueued_at = time.perf_counter()
+        frames: Dict[str, Any] = {}
+        targets = self.clients.values() if websockets is None else (self.clients.get(ws) for ws in websockets)
+        for client in list(targets):
+            if client is None:
+                continue
+            frame = frames.get(client.encoding)
+            if frame is None:
+                frame = frames[client.encoding] = encode(payload, client.encoding)
+            self._enqueue(client, frame, enqueued_at)
+
+    def encodings(self) -> Dict[str, int]:
+        counts: Dict[str, int] = {}
+        for client in self.clients.values():
+            counts[client.encoding] = counts.get(client.encoding, 0) + 1
+        return counts
+
+    def _enqueue(self, client: Client, message: Any, enqueued_at: float) -> bool:
+        try:
+            client.queue.put_nowait((message, enqueued_at))
+            return True
+        except asyncio.QueueFull:
+            self._evict(client, "outbound queue full")
+            return False
+
+    def _evict(self, client: Client, reason: str):
+        if self.clients.get(client.websocket) is not client:
+            return
+        self.evictions += 1
+        logger.warning(f"Evicting slow WebSocket client: {reason}")
+        self.disconnect(client.websocket)
+        asyncio.create_task(self._close(client.websocket))
+
+    async def _close(self, websocket: WebSocket):
+        try:
+            # 1013: try again later
+            await asyncio.wait_for(websocket.close(code=1013), self.send_timeout)
+        except Exception:
+            pass
+
+    async def _sender(self, client: Client):
+        websocket = client.websocket
+        while True:
+            message, enqueued_at = await client.queue.get()
+            try:
+                if isinstance(message, bytes):
+                    await asyncio.wait_for(websocket.send_bytes(message), self.send_timeout)
+                else:
+                    await asyncio.wait_for(websocket.send_text(message), self.send_timeout)
+            except asyncio.CancelledError:
+                raise
+            except asyncio.TimeoutError:
+                self._evict(client, "send timed out")
+                return
+            except Exception:
+                self.disconnect(websocket)
+                return
+            client.sent += 1
+            self.messages_sent += 1
+            self.latencies.append(time.perf_counter() - enqueued_at)
+
+    def metrics(self) -> Dict[str, Any]:
+        samples = np.array(self.latencies) * 1000 if self.latencies else None
+        percentiles = (
+            dict(zip(["p50_ms", "p95_ms", "p99_ms"], np.round(np.percentile(samples, [50, 95, 99]), 3).tolist()))
+            if samples is not None else {"p50_ms": None, "p95_ms": None, "p99_ms": None}
+        )
+        return {
+            "connections": len(self.clients),
+            "broadcasts": self.broadcasts,
+            "messages_sent": self.messages_sent,
+            "evictions": self.evictions,
+            "queued_messages": sum(c.queue.qsize() for c in self.clients.values()),
+            "encodings": self.encodings(),
+            "fanout_latency": {
+                "samples": len(self.latencies),
+                **percentiles,
+                "max_ms": round(float(samples.max()), 3) if samples is not None else None,
+            },
+            "queue_size": self.queue_size,
+            "send_timeout": self.send_timeout,
+        }
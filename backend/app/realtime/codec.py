@@ -0,0 +1,52 @@
+import json
+from datetime import datetime
+from typing import Any, Dict, Optional, Tuple, Union
+from fastapi import WebSocket
+
+try:
+    import msgpack
+except ImportError:  # optional: clients fall back to JSON text frames
+    msgpack = None
+
+JSON = "json"
+MSGPACK = "msgpack"
+
+Frame = Union[str, bytes]
+
+
+def available_encodings():
+    return [JSON, MSGPACK] if msgpack else [JSON]
+
+
+def negotiate(websocket: WebSocket) -> Tuple[str, Optional[str]]:
+    """Pick the frame encoding for a connecting client.
+
+    Clients ask for MessagePack with `?encoding=msgpack` or by offering the `msgpack`
+    subprotocol. Returns the encoding and the subprotocol to accept, if any.
+    """
+    offered = websocket.scope.get("subprotocols") or []
+    if MSGPACK in offered and msgpack:
+        return MSGPACK, MSGPACK
+    if websocket.query_params.get("encoding") == MSGPACK and msgpack:
+        return MSGPACK, None
+    return JSON, JSON if JSON in offered else None
+
+
+def message(message_type: str, data: Dict[str, Any]) -> Dict[str, Any]:
+    """Envelope matching WebSocketMessage, built without model validation"""
+    return {"type": message_type, "data": data, "timestamp": datetime.utcnow().isoformat()}
+
+
+def encode(payload: Dict[str, Any], encoding: str) -> Frame:
+    if encoding == MSGPACK:
+        return msgpack.packb(payload, use_bin_type=True)
+    return json.dumps(payload, separators=(",", ":"))
+
+
+def decode(frame: Dict[str, Any]) -> Dict[str, Any]:
+    """Parse a client frame from websocket.receive(); binary frames are MessagePack"""
+    if frame.get("bytes") is not None:
+        if not msgpack:
+            raise ValueError("Binary frames need msgpack")
+        return msgpack.unpackb(frame["bytes"], raw=False)
+    return json.loads(frame["text"])
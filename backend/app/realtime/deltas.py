@@ -0,0 +1,57 @@
+import uuid
+from typing import Any, Dict, Optional, Tuple
+
+
+class DeltaTracker:
+    """Tracks the last broadcast campus state and turns new stats into field-level deltas.
+
+    Every change to the tracked state gets the next sequence number. Clients apply deltas
+    in order; a client that sees a sequence number other than last + 1 has missed an
+    update and asks for a snapshot instead. The epoch names one run of the sequence; it
+    changes when a tracker starts over from zero, so positions from before are not reused.
+    """
+
+    def __init__(self):
+        self.epoch = uuid.uuid4().hex[:8]
+        self.seq = 0
+        self.state: Dict[str, Dict[str, Any]] = {}
+        self._events_seq = 0
+        self._events = 0
+
+    def update(self, stats: Dict[str, Dict[str, Any]]) -> Tuple[int, Dict[str, Dict[str, Any]]]:
+        """Merge new stats; returns the sequence number and only the fields that changed"""
+        changes = {}
+        for building_id, values in stats.items():
+            previous = self.state.get(building_id, {})
+            changed = {key: value for key, value in values.items() if previous.get(key) != value}
+            if changed:
+                changes[building_id] = changed
+                self.state[building_id] = {**previous, **changed}
+
+        if changes:
+            self.seq += 1
+        return self.seq, changes
+
+    def next_event_id(self) -> str:
+        """Id for a non-delta event (e.g. an anomaly) published after the current delta, "<seq>.<n>"."""
+        if self._events_seq != self.seq:
+            self._events_seq, self._events = self.seq, 0
+        self._events += 1
+        return f"{self.seq}.{self._events}"
+
+    def apply(self, seq: int, changes: Dict[str, Dict[str, Any]], epoch: Optional[str] = None):
+        """Follow deltas produced by another tracker"""
+        if epoch is not None:
+            self.epoch = epoch
+        for building_id, changed in changes.items():
+            self.state[building_id] = {**self.state.get(building_id, {}), **changed}
+        self.seq = seq
+
+    def restore(self, seq: int, state: Dict[str, Dict[str, Any]], epoch: Optional[str] = None):
+        if epoch is not None:
+            self.epoch = epoch
+        self.seq = seq
+        self.state = {building_id: dict(values) for building_id, values in state.items()}
+
+    def snapshot(self) -> Tuple[int, Dict[str, Dict[str, Any]]]:
+        return self.seq, {building_id: dict(values) for building_id, values in self.state.items()}
@@ -0,0 +1,70 @@
+import asyncio
+import logging
+from collections import defaultdict
+from typing import Any, Dict, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+# Topic carrying {"timestamp": ..., "readings": {building: {data_type: value}}}
+READINGS = "readings"
+# Topic carrying one anomaly notification (building_id, data_type, value, severity, ...)
+ANOMALIES = "anomalies"
+# Readings from every worker, relayed through the fan-out backend to the leader
+CAMPUS_READINGS = "campus_readings"
+
+
+class EventBus:
+    """In-process pub/sub between producers and async consumers.
+
+    Consumers subscribe from the event loop and get their own bounded queue. `publish` may be
+    called from the loop or from any worker thread (e.g. the query executor); events are
+    always delivered on the loop. A consumer that falls behind loses its oldest events rather
+    than blocking producers - every event carries the latest values, so newer ones win.
+    """
+
+    def __init__(self, queue_size: int = 256):
+        self.queue_size = queue_size
+        self.subscribers: Dict[str, Set[asyncio.Queue]] = defaultdict(set)
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.published = 0
+        self.dropped = 0
+
+    def subscribe(self, topic: str) -> asyncio.Queue:
+        self.loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+        self.subscribers[topic].add(queue)
+        return queue
+
+    def unsubscribe(self, topic: str, queue: asyncio.Queue):
+        self.subscribers[topic].discard(queue)
+
+    def publish(self, topic: str, event: Any):
+        if self.loop is None or not self.subscribers.get(topic):
+            return
+        try:
+            on_loop = asyncio.get_running_loop() is self.loop
+        except RuntimeError:
+            on_loop = False
+
+        if on_loop:
+            self._deliver(topic, event)
+        elif not self.loop.is_closed():
+            self.loop.call_soon_threadsafe(self._deliver, topic, event)
+
+    def _deliver(self, topic: str, event: Any):
+        self.published += 1
+        for queue in list(self.subscribers.get(topic, ())):
+            if queue.full():
+                queue.get_nowait()
+                self.dropped += 1
+            queue.put_nowait(event)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "subscribers": {topic: len(queues) for topic, queues in self.subscribers.items()},
+            "published": self.published,
+            "dropped": self.dropped,
+        }
+
+
+event_bus = EventBus()
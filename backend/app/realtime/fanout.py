@@ -0,0 +1,207 @@
+import asyncio
+import json
+import logging
+import os
+import socket
+import uuid
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+Handler = Callable[[str, Dict[str, Any]], Awaitable[None]]
+
+
+class FanoutBackend:
+    """Carries real-time messages between API workers.
+
+    A message published on a channel reaches the handler of every worker, the publisher's
+    included. Backends also hold small shared values (the latest snapshot) and named leases
+    used to pick the one worker that runs the producers.
+    """
+
+    async def start(self, handler: Handler):
+        raise NotImplementedError
+
+    async def publish(self, channel: str, message: Dict[str, Any]):
+        raise NotImplementedError
+
+    async def store(self, key: str, value: Dict[str, Any]):
+        raise NotImplementedError
+
+    async def load(self, key: str) -> Optional[Dict[str, Any]]:
+        raise NotImplementedError
+
+    async def acquire_lease(self, name: str, ttl: float) -> bool:
+        """Take or renew a lease; returns whether this worker holds it"""
+        raise NotImplementedError
+
+    async def release_lease(self, name: str):
+        raise NotImplementedError
+
+    async def stop(self):
+        pass
+
+
+class LocalFanout(FanoutBackend):
+    """Single-process backend: publishing calls the handler directly and this worker always leads"""
+
+    def __init__(self):
+        self.handler: Optional[Handler] = None
+        self.values: Dict[str, Dict[str, Any]] = {}
+
+    async def start(self, handler: Handler):
+        self.handler = handler
+
+    async def publish(self, channel: str, message: Dict[str, Any]):
+        if self.handler:
+            await self.handler(channel, message)
+
+    async def store(self, key: str, value: Dict[str, Any]):
+        self.values[key] = value
+
+    async def load(self, key: str) -> Optional[Dict[str, Any]]:
+        return self.values.get(key)
+
+    async def acquire_lease(self, name: str, ttl: float) -> bool:
+        return True
+
+    async def release_lease(self, name: str):
+        pass
+
+
+# Extend the lease only if this worker still owns it
+_RENEW_LEASE = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('pexpire', KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+_RELEASE_LEASE = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+
+class RedisFanout(FanoutBackend):
+    """Pub/sub through a Redis-compatible server, reached over TCP (redis://) or a UNIX socket (unix://)"""
+
+    def __init__(self, url: str, prefix: str = "campus_twin"):
+        import redis.asyncio as redis
+
+        self.redis = redis.from_url(url)
+        self.prefix = prefix
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.reader: Optional[asyncio.Task] = None
+
+    def _key(self, kind: str, name: str) -> str:
+        return f"{self.prefix}:{kind}:{name}"
+
+    async def start(self, handler: Handler):
+        self.reader = asyncio.create_task(self._read(handler))
+
+    async def _read(self, handler: Handler):
+        channel_prefix = self._key("channel", "")
+        while True:
+            pubsub = self.redis.pubsub(ignore_subscribe_messages=True)
+            try:
+                await pubsub.psubscribe(f"{channel_prefix}*")
+                async for message in pubsub.listen():
+                    if message["type"] != "pmessage":
+                        continue
+                    channel = message["channel"].decode()[len(channel_prefix):]
+                    try:
+                        await handler(channel, json.loads(message["data"]))
+                    except Exception as e:
+                        logger.error(f"Error handling fan-out message on {channel}: {e}")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Fan-out subscription lost, reconnecting: {e}")
+                await asyncio.sleep(1)
+            finally:
+                await pubsub.aclose()
+
+    async def publish(self, channel: str, message: Dict[str, Any]):
+        await self.redis.publish(self._key("channel", channel), json.dumps(message))
+
+    async def store(self, key: str, value: Dict[str, Any]):
+        await self.redis.set(self._key("value", key), json.dumps(value))
+
+    async def load(self, key: str) -> Optional[Dict[str, Any]]:
+        raw = await self.redis.get(self._key("value", key))
+        return json.loads(raw) if raw else None
+
+    async def acquire_lease(self, name: str, ttl: float) -> bool:
+        key = self._key("lease", name)
+        ttl_ms = int(ttl * 1000)
+        if await self.redis.set(key, self.worker_id, nx=True, px=ttl_ms):
+            return True
+        return bool(await self.redis.eval(_RENEW_LEASE, 1, key, self.worker_id, ttl_ms))
+
+    async def release_lease(self, name: str):
+        await self.redis.eval(_RELEASE_LEASE, 1, self._key("lease", name), self.worker_id)
+
+    async def stop(self):
+        if self.reader:
+            self.reader.cancel()
+            try:
+                await self.reader
+            except asyncio.CancelledError:
+                pass
+        await self.redis.aclose()
+
+
+def create_fanout(url: str) -> FanoutBackend:
+    """Backend for a WS_FANOUT_URL: memory:// for a single worker, redis:// or unix:// to span workers"""
+    if url.startswith("memory://"):
+        return LocalFanout()
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        return RedisFanout(url)
+    raise ValueError(f"Unsupported WS_FANOUT_URL: {url}")
+
+
+class LeaderElection:
+    """Holds a lease in the fan-out backend and runs callbacks when this worker gains or loses it.
+
+    Exactly one worker at a time holds the lease and runs the singleton tasks (simulation,
+    producers, rollups). A leader that cannot renew, e.g. because the broker is unreachable,
+    steps down, since its lease may already have passed to another worker.
+    """
+
+    def __init__(self, backend: FanoutBackend, name: str, ttl: float,
+                 on_elected: Callable[[], Awaitable[None]], on_demoted: Callable[[], Awaitable[None]]):
+        self.backend = backend
+        self.name = name
+        self.ttl = ttl
+        self.on_elected = on_elected
+        self.on_demoted = on_demoted
+        self.is_leader = False
+
+    async def run(self):
+        try:
+            while True:
+                try:
+                    held = await self.backend.acquire_lease(self.name, self.ttl)
+                except Exception as e:
+                    logger.warning(f"Could not renew leader lease: {e}")
+                    held = False
+
+                if held and not self.is_leader:
+                    self.is_leader = True
+                    await self.on_elected()
+                elif not held and self.is_leader:
+                    self.is_leader = False
+                    await self.on_demoted()
+
+                await asyncio.sleep(self.ttl / 3)
+        finally:
+            if self.is_leader:
+                self.is_leader = False
+                await self.on_demoted()
+                try:
+                    await self.backend.release_lease(self.name)
+                except Exception:
+                    pass
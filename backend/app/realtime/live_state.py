@@ -0,0 +1,43 @@
+from typing import Any, Dict
+import numpy as np
+from app.db.influx_client import STATS_TYPES, building_stats_row, score_buildings
+from app.realtime.topics import METRIC_FIELDS
+
+
+class LiveState:
+    """Latest reading per building and metric, turned into the same stats shape as
+    get_building_stats so clients can consume pushed and polled stats alike."""
+
+    def __init__(self):
+        self.readings: Dict[str, Dict[str, float]] = {}
+
+    def seed(self, stats: Dict[str, Dict[str, Any]]):
+        """Start from queried stats so buildings without a fresh reading still have values"""
+        for building_id, building in stats.items():
+            if building.get("status") in ("error", "unknown"):
+                continue
+            current = self.readings.setdefault(building_id, {})
+            for data_type, field in METRIC_FIELDS.items():
+                current.setdefault(data_type, float(building.get(field, 0)))
+
+    def apply(self, readings: Dict[str, Dict[str, float]]) -> Dict[str, Dict[str, Any]]:
+        """Merge new readings; returns the rescored stats of the buildings they touched"""
+        touched = []
+        for building_id, values in readings.items():
+            current = self.readings.setdefault(building_id, {})
+            current.update({t: v for t, v in values.items() if t in STATS_TYPES})
+            touched.append(building_id)
+        return self.stats(touched)
+
+    def stats(self, buildings=None) -> Dict[str, Dict[str, Any]]:
+        buildings = list(self.readings) if buildings is None else buildings
+        if not buildings:
+            return {}
+        means = np.array([
+            [self.readings[b].get(t, 0.0) for t in STATS_TYPES] for b in buildings
+        ])
+        scores, statuses = score_buildings(means)
+        return {
+            building: building_stats_row(building, means[i], scores[i], statuses[i])
+            for i, building in enumerate(buildings)
+        }
@@ -0,0 +1,103 @@
+import asyncio
+import json
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Set, Tuple
+
+# Event ids are "<epoch>:<seq>" for deltas and "<epoch>:<seq>.<n>" for the n-th other event
+# after that delta. The epoch changes whenever the sequence restarts (a fresh leader state),
+# so an id from before a restart is never mistaken for a position in the new sequence.
+EventKey = Tuple[int, int]
+
+DELTA = "delta"
+SNAPSHOT = "snapshot"
+
+
+def parse_event_id(event_id: str) -> Optional[Tuple[str, EventKey]]:
+    try:
+        epoch, _, position = event_id.rpartition(":")
+        seq, _, n = position.partition(".")
+        return epoch, (int(seq), int(n or 0))
+    except (AttributeError, ValueError):
+        return None
+
+
+def format_event_id(epoch: str, key: EventKey) -> str:
+    seq, n = key
+    return f"{epoch}:{seq}.{n}" if n else f"{epoch}:{seq}"
+
+
+def format_event(event_id: str, event_type: str, data: Dict[str, Any]) -> str:
+    return f"id: {event_id}\nevent: {event_type}\ndata: {json.dumps(data, separators=(',', ':'))}\n\n"
+
+
+class Subscriber:
+    """A connected SSE stream. One that cannot keep up is ended and resumes via Last-Event-ID."""
+
+    def __init__(self, queue_size: int):
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.overflowed = False
+
+    def push(self, key: EventKey, frame: str, event_type: str):
+        if self.overflowed:
+            return
+        try:
+            self.queue.put_nowait((key, frame, event_type))
+        except asyncio.QueueFull:
+            self.overflowed = True
+
+
+class EventLog:
+    """Ring buffer of recent formatted events plus the live SSE subscribers.
+
+    Each event is formatted once and shared by every stream. Everything after `floor` up
+    to `head` is still in the buffer, so a client whose Last-Event-ID is in that range and
+    in the current epoch can be replayed exactly; anyone else gets a fresh snapshot.
+    """
+
+    def __init__(self, size: int = 1000, queue_size: int = 256):
+        self.events: Deque[Tuple[EventKey, str]] = deque(maxlen=size)
+        self.epoch = ""
+        self.floor: EventKey = (0, 0)
+        self.head: EventKey = (0, 0)
+        self.queue_size = queue_size
+        self.subscribers: Set[Subscriber] = set()
+
+    def append(self, key: EventKey, event_type: str, data: Dict[str, Any]):
+        frame = format_event(format_event_id(self.epoch, key), event_type, data)
+        if len(self.events) == self.events.maxlen:
+            self.floor = self.events[0][0]
+        self.events.append((key, frame))
+        self.head = max(self.head, key)
+        for subscriber in list(self.subscribers):
+            subscriber.push(key, frame, event_type)
+
+    def since(self, epoch: str, key: EventKey) -> Optional[List[Tuple[EventKey, str]]]:
+        """Events after `key`, or None when `key` can't be resumed from this buffer"""
+        if epoch != self.epoch or key < self.floor or key > self.head:
+            return None
+        return [(k, frame) for k, frame in self.events if k > key]
+
+    def reset(self, epoch: str, key: EventKey, snapshot: Dict[str, Any]):
+        """Forget history after this worker resynced, and resync the open streams too"""
+        self.events.clear()
+        self.epoch = epoch
+        self.floor = self.head = key
+        frame = format_event(format_event_id(epoch, key), SNAPSHOT, snapshot)
+        for subscriber in list(self.subscribers):
+            subscriber.push(key, frame, SNAPSHOT)
+
+    def subscribe(self) -> Subscriber:
+        subscriber = Subscriber(self.queue_size)
+        self.subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber):
+        self.subscribers.discard(subscriber)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "subscribers": len(self.subscribers),
+            "buffered_events": len(self.events),
+            "epoch": self.epoch,
+            "oldest_resumable_id": format_event_id(self.epoch, self.floor),
+        }
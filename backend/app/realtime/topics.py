@@ -0,0 +1,108 @@
+from collections import defaultdict
+from typing import Any, Dict, FrozenSet, Iterable, List, Optional, Set, Tuple
+from fastapi import WebSocket
+
+# Subscribable data types and the stats field each one maps to
+METRIC_FIELDS = {
+    "energy": "avg_energy",
+    "water": "water_usage",
+    "co2": "co2_levels",
+    "occupancy": "occupancy",
+}
+
+# Fields every subscriber of a building receives regardless of metric
+BASE_FIELDS = ("building_id", "sustainability_score", "status")
+
+Topic = Tuple[str, str]  # (building_id, data_type)
+View = Optional[FrozenSet[Topic]]  # None means the full campus payload
+
+
+class TopicRegistry:
+    """Maps (building, data_type) topics to the sockets subscribed to them.
+
+    Clients without any subscription keep receiving the full campus payload.
+    """
+
+    def __init__(self):
+        self.topics: Dict[Topic, Set[WebSocket]] = defaultdict(set)
+        self.client_topics: Dict[WebSocket, Set[Topic]] = {}
+
+    def subscribe(self, websocket: WebSocket, building_id: str, data_types: Optional[Iterable[str]] = None) -> List[str]:
+        """Subscribe to some (default: all) metrics of a building; returns the metrics now subscribed.
+
+        Unknown data types are ignored; if none is valid nothing is stored.
+        """
+        types = [t for t in (data_types or METRIC_FIELDS) if t in METRIC_FIELDS]
+        if not types:
+            return sorted(t for b, t in self.client_topics.get(websocket, ()) if b == building_id)
+        subscribed = self.client_topics.setdefault(websocket, set())
+        for data_type in types:
+            topic = (building_id, data_type)
+            self.topics[topic].add(websocket)
+            subscribed.add(topic)
+        return sorted(t for b, t in subscribed if b == building_id)
+
+    def unsubscribe(self, websocket: WebSocket, building_id: Optional[str] = None, data_types: Optional[Iterable[str]] = None):
+        """Drop matching subscriptions; with no building every subscription of the socket is dropped"""
+        subscribed = self.client_topics.get(websocket)
+        if not subscribed:
+            return
+        for topic in list(subscribed):
+            building, data_type = topic
+            if building_id and building != building_id:
+                continue
+            if data_types and data_type not in data_types:
+                continue
+            subscribed.discard(topic)
+            sockets = self.topics.get(topic)
+            if sockets is not None:
+                sockets.discard(websocket)
+                if not sockets:
+                    del self.topics[topic]
+        if not subscribed:
+            del self.client_topics[websocket]
+
+    def remove(self, websocket: WebSocket):
+        self.unsubscribe(websocket)
+
+    def view(self, websocket: WebSocket) -> View:
+        subscribed = self.client_topics.get(websocket)
+        return frozenset(subscribed) if subscribed else None
+
+    def group_by_view(self, websockets: Iterable[WebSocket]) -> Dict[View, List[WebSocket]]:
+        """Group sockets with identical subscriptions so each payload is built and encoded once"""
+        groups: Dict[View, List[WebSocket]] = defaultdict(list)
+        for websocket in websockets:
+            groups[self.view(websocket)].append(websocket)
+        return groups
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "topics": len(self.topics),
+            "subscribed_clients": len(self.client_topics),
+            "distinct_views": len({frozenset(t) for t in self.client_topics.values()}),
+        }
+
+
+def filter_stats(stats: Dict[str, Any], view: View) -> Dict[str, Any]:
+    """Reduce a campus stats dict to the buildings and metrics in a view"""
+    if view is None:
+        return stats
+
+    fields: Dict[str, Set[str]] = defaultdict(set)
+    for building_id, data_type in view:
+        fields[building_id].add(METRIC_FIELDS[data_type])
+
+    filtered = {}
+    for building_id, metric_fields in fields.items():
+        building = stats.get(building_id)
+        if building is None:
+            continue
+        values = {
+            key: value for key, value in building.items()
+            if key in BASE_FIELDS or key in metric_fields
+        }
+        # Deltas carry only changed fields, so a building can filter down to nothing
+        if values:
+            filtered[building_id] = values
+    return filtered
@@ -3,8 +3,39 @@ import random
 from datetime import datetime
 from typing import Dict, Any
 import numpy as np
-from app.db.influx_client import write_sensor_data
+from app.db.influx_client import write_sensor_data, write_sensor_matrix, sensor_line_prefixes
 from app.core.config import settings
+from app.realtime.event_bus import event_bus, READINGS, ANOMALIES
+
+# Anomaly kinds and the multiplier range applied to the normal reading
+ANOMALY_RANGES = {
+    "spike": (2.0, 5.0),
+    "drop": (0.1, 0.3),
+    "gradual_increase": (1.1, 1.5),
+    "gradual_decrease": (0.5, 0.9),
+}
+
+# Clamp bounds per data type, mirroring generate_sensor_value
+VALUE_BOUNDS = {
+    "energy": (0.0, np.inf),
+    "water": (0.0, np.inf),
+    "occupancy": (0.0, np.inf),
+    "temperature": (18.0, 28.0),
+    "co2": (400.0, 1200.0),
+}
+
+def anomaly_event(building_id: str, data_type: str, value: float, expected: float, timestamp: str) -> Dict[str, Any]:
+    """Anomaly notification for live clients; severity (0-100) grows with the deviation from normal"""
+    factor = value / expected if expected else 1.0
+    return {
+        "building_id": building_id,
+        "data_type": data_type,
+        "value": round(float(value), 2),
+        "expected": round(float(expected), 2),
+        "severity": int(min(100, round(abs(factor - 1) * 100))),
+        "description": f"{data_type} {'spike' if factor > 1 else 'drop'} to {factor:.1f}x the expected level",
+        "timestamp": timestamp,
+    }
 
 class DataGenerator:
     def __init__(self):
@@ -24,36 +55,74 @@ class DataGenerator:
         self.building_types = {}
         for building in self.buildings:
             self.building_types[building] = random.choice(list(self.building_profiles.keys()))
-    
-    def generate_sensor_value(self, building_id: str, data_type: str) -> float:
-        """Generate realistic sensor value (always returns float)"""
+
+        # Precomputed arrays for the vectorized tick
+        self.rng = np.random.default_rng()
+        self.base_matrix = np.array([
+            [self._base_value(building, data_type) for data_type in self.data_types]
+            for building in self.buildings
+        ])
+        self.lower_bounds = np.array([VALUE_BOUNDS.get(t, (-np.inf, np.inf))[0] for t in self.data_types])
+        self.upper_bounds = np.array([VALUE_BOUNDS.get(t, (-np.inf, np.inf))[1] for t in self.data_types])
+        self.line_prefixes = sensor_line_prefixes(self.buildings, self.data_types)
+
+    def _base_value(self, building_id: str, data_type: str) -> float:
         profile = self.building_profiles[self.building_types[building_id]]
-        
-        # Get base value (always as float)
-        if data_type == "energy":
-            base = float(profile["energy_base"])
-        elif data_type == "water":
-            base = float(profile["water_base"])
-        elif data_type == "occupancy":
-            base = float(profile["occupancy_base"])  # Convert occupancy to float
+        if data_type in ("energy", "water", "occupancy"):
+            return float(profile[f"{data_type}_base"])
         elif data_type == "temperature":
-            base = 22.0  # Room temperature
+            return 22.0  # Room temperature
         elif data_type == "co2":
-            base = 600.0  # ppm
-        else:
-            base = 100.0  # Default
+            return 600.0  # ppm
+        return 100.0  # Default
+
+    @staticmethod
+    def daily_multiplier(hour: int) -> float:
+        """Campus-wide activity factor for the given hour of day"""
+        if 8 <= hour <= 18:  # Daytime peak
+            return 1.5 + 0.5 * np.sin((hour - 8) * np.pi / 10)
+        elif 19 <= hour <= 22:  # Evening
+            return 0.8 + 0.2 * np.sin((hour - 19) * np.pi / 4)
+        return 0.4 + 0.1 * np.sin(hour * np.pi / 12)  # Night
+
+    def generate_tick_matrix(self, now: datetime = None, anomaly_probability: float = 0.05):
+        """Generate one reading for every building x data type in a single vectorized step.
+
+        Returns the (buildings, data_types) value matrix and the boolean mask of cells
+        that received an injected anomaly.
+        """
+        now = now or datetime.now()
+        shape = self.base_matrix.shape
+
+        multiplier = self.daily_multiplier(now.hour)
+        minute_variation = 0.1 * np.sin(now.minute * np.pi / 30)
+        noise = self.rng.uniform(-0.1, 0.1, size=shape)
+
+        values = self.base_matrix * multiplier * (1 + noise + minute_variation)
+        values = np.clip(values, self.lower_bounds, self.upper_bounds)
+        values = np.round(values, 2)
+
+        # Anomalies: pick a kind per flagged cell and scale by a factor from its range
+        anomaly_mask = self.rng.random(shape) < anomaly_probability
+        if anomaly_mask.any():
+            ranges = np.array(list(ANOMALY_RANGES.values()))
+            kinds = self.rng.integers(0, len(ranges), size=shape)
+            factors = self.rng.uniform(ranges[kinds, 0], ranges[kinds, 1])
+            values = np.where(anomaly_mask, values * factors, values)
+
+        return values, anomaly_mask
+    
+    def generate_sensor_value(self, building_id: str, data_type: str) -> float:
+        """Generate realistic sensor value (always returns float)"""
+        base = self._base_value(building_id, data_type)
         
         # Add time-based variation
-        hour = datetime.now().hour
-        minute = datetime.now().minute
+        now = datetime.now()
+        hour = now.hour
+        minute = now.minute
         
         # Daily pattern
-        if 8 <= hour <= 18:  # Daytime peak
-            multiplier = 1.5 + 0.5 * np.sin((hour - 8) * np.pi / 10)
-        elif 19 <= hour <= 22:  # Evening
-            multiplier = 0.8 + 0.2 * np.sin((hour - 19) * np.pi / 4)
-        else:  # Night
-            multiplier = 0.4 + 0.1 * np.sin(hour * np.pi / 12)
+        multiplier = self.daily_multiplier(hour)
         
         # Add random noise
         noise = random.uniform(-0.1, 0.1)
@@ -105,15 +174,24 @@ class DataGenerator:
         
         while self.is_running:
             try:
+                if settings.SIMULATION_TICK_MODE == "matrix":
+                    self.run_matrix_tick(anomaly_probability)
+                    await asyncio.sleep(interval_seconds)
+                    continue
+
                 for building in self.buildings:
                     for data_type in self.data_types:
                         value = self.generate_sensor_value(building, data_type)
                         
                         if random.random() < anomaly_probability:
+                            expected = value
                             value = self.generate_anomaly(building, data_type, value)
                             print(f"ANOMALY TRIGGERED: {building} | {data_type}: {value}")
+                            event_bus.publish(ANOMALIES, anomaly_event(
+                                building, data_type, value, expected, datetime.utcnow().isoformat()
+                            ))
                         
-                        write_sensor_data(building, data_type, value)
+                        write_sensor_data(building, data_type, value, block=False)
                         
                 # Wait for the next tick
                 await asyncio.sleep(interval_seconds)
@@ -124,6 +202,39 @@ class DataGenerator:
                 
         print("Automated simulation stopped.")
 
+    def run_matrix_tick(self, anomaly_probability: float = 0.05):
+        """Generate and write one full campus tick as a single batch.
+
+        Runs on the event loop, so a full write buffer drops the tick rather than waiting.
+        """
+        now = datetime.now()
+        values, anomaly_mask = self.generate_tick_matrix(now, anomaly_probability)
+
+        anomaly_count = int(anomaly_mask.sum())
+        if anomaly_count:
+            print(f"ANOMALIES TRIGGERED: {anomaly_count} of {values.size} readings")
+
+        timestamp = datetime.utcnow()
+        if write_sensor_matrix(self.line_prefixes, values, timestamp, block=False):
+            event_bus.publish(READINGS, {
+                "timestamp": timestamp.isoformat(),
+                "readings": {
+                    building: dict(zip(self.data_types, row))
+                    for building, row in zip(self.buildings, values.tolist())
+                }
+            })
+            if anomaly_count:
+                # Compare against the noise-free reading for this time of day
+                expected = np.clip(
+                    self.base_matrix * self.daily_multiplier(now.hour) * (1 + 0.1 * np.sin(now.minute * np.pi / 30)),
+                    self.lower_bounds, self.upper_bounds
+                )
+                for i, j in zip(*np.nonzero(anomaly_mask)):
+                    event_bus.publish(ANOMALIES, anomaly_event(
+                        self.buildings[i], self.data_types[j], values[i, j], expected[i, j], timestamp.isoformat()
+                    ))
+        return values, anomaly_mask
+
     def stop_simulation(self):
         """Gracefully stops the infinite loop"""
         self.is_running = False
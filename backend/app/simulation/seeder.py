@@ -0,0 +1,196 @@
+import time
+import logging
+import random
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Any, List, Optional
+import numpy as np
+from app.core.config import settings
+from app.db import influx_client
+from app.db.influx_client import write_line_protocol, sensor_line_prefixes
+
+logger = logging.getLogger(__name__)
+
+DATA_TYPES = ["energy", "water", "occupancy", "temperature", "co2"]
+
+# Uniform range each data type is drawn from before the daily pattern is applied
+VALUE_RANGES = {
+    "energy": (50.0, 200.0),        # kWh
+    "water": (100.0, 500.0),        # liters
+    "occupancy": (0.0, 200.0),      # people
+    "temperature": (18.0, 25.0),    # degrees C
+    "co2": (400.0, 800.0),          # ppm
+}
+
+# Daily pattern multipliers (daytime is 08:00-18:59)
+DAY_FACTOR = (1.2, 2.0)
+NIGHT_FACTOR = (0.3, 0.8)
+
+# One point per seeding run, stamped with the run's end time: written as incomplete
+# before the first chunk and rewritten as completed once every chunk has succeeded
+SEED_MARKER = "seed_marker"
+
+
+def generate_block(rng: np.random.Generator, timestamps: np.ndarray, n_buildings: int, data_types: List[str]) -> np.ndarray:
+    """Generate a (time, building, type) array of synthetic readings for the given timestamps"""
+    shape = (len(timestamps), n_buildings, len(data_types))
+    low = np.array([VALUE_RANGES[t][0] for t in data_types])
+    high = np.array([VALUE_RANGES[t][1] for t in data_types])
+
+    values = rng.uniform(low, high, size=shape)
+    if "occupancy" in data_types:
+        idx = data_types.index("occupancy")
+        values[:, :, idx] = rng.integers(0, 201, size=shape[:2])
+
+    hours = timestamps.astype("datetime64[h]").astype(np.int64) % 24
+    daytime = ((hours >= 8) & (hours <= 18))[:, None, None]
+    factor = np.where(
+        daytime,
+        rng.uniform(DAY_FACTOR[0], DAY_FACTOR[1], size=shape),
+        rng.uniform(NIGHT_FACTOR[0], NIGHT_FACTOR[1], size=shape),
+    )
+    return values * factor
+
+
+def format_block(prefixes: np.ndarray, timestamps: np.ndarray, values: np.ndarray) -> str:
+    """Format a (time, building, type) block as newline-separated line protocol"""
+    ts_ns = timestamps.astype("datetime64[ns]").astype(np.int64).astype(str).astype(object)
+    vals = np.char.mod("%.4f", values).astype(object)
+    lines = prefixes[None, :, :] + vals + " " + ts_ns[:, None, None]
+    return "\n".join(lines.ravel().tolist())
+
+
+def marker_line(end_time: datetime, days: float, resolution_minutes: int, completed: bool) -> str:
+    ts_ns = np.datetime64(end_time, "ns").astype(np.int64)
+    return (
+        f"{SEED_MARKER} days={float(days)},resolution_minutes={int(resolution_minutes)}i,"
+        f"completed={'true' if completed else 'false'} {ts_ns}"
+    )
+
+
+def last_seed_run() -> Optional[Dict[str, Any]]:
+    """The most recent seeding run recorded in the bucket, or None if there never was one"""
+    query = f'''
+    from(bucket: "{settings.INFLUXDB_BUCKET}")
+        |> range(start: 0)
+        |> filter(fn: (r) => r._measurement == "{SEED_MARKER}")
+        |> last()
+        |> pivot(rowKey: ["_time"], columnKey: ["_field"], valueColumn: "_value")
+    '''
+    tables = influx_client.query_api.query(query, org=settings.INFLUXDB_ORG)
+    records = [record for table in tables for record in table.records]
+    if not records:
+        return None
+    latest = max(records, key=lambda record: record.get_time())
+    return {
+        "end_time": latest.get_time().replace(tzinfo=None),
+        "days": latest.values["days"],
+        "resolution_minutes": latest.values["resolution_minutes"],
+        "completed": bool(latest.values["completed"]),
+    }
+
+
+def write_chunk(body: str, max_retries: int, retry_base_delay: float):
+    """Write one chunk, retrying with exponential backoff like the buffered writer"""
+    for attempt in range(max_retries + 1):
+        try:
+            write_line_protocol(body)
+            return
+        except Exception as e:
+            if attempt == max_retries:
+                raise
+            # Exponential backoff with full jitter
+            delay = random.uniform(0, retry_base_delay * (2 ** attempt))
+            logger.warning(f"Seed chunk write failed ({e}), retrying in {delay:.2f}s")
+            time.sleep(delay)
+
+
+def seed_history(
+    days: float = 7,
+    resolution_minutes: int = 15,
+    n_buildings: Optional[int] = None,
+    seed: Optional[int] = None,
+    end_time: Optional[datetime] = None,
+    chunk_points: int = 100000,
+    workers: int = 4,
+    progress: Optional[Callable[[int, int], None]] = None,
+    max_retries: int = settings.WRITE_MAX_RETRIES,
+    retry_base_delay: float = settings.WRITE_RETRY_BASE_DELAY,
+) -> Dict[str, Any]:
+    """Bulk-load synthetic history for every building and data type.
+
+    The time axis is processed in slabs of roughly `chunk_points` readings; each slab is
+    generated as one NumPy array, formatted as line protocol and written by a pool of
+    `workers` threads, so memory stays bounded regardless of the requested span.
+
+    Failed chunks are retried with backoff; if one still fails the run raises and its
+    marker stays incomplete. Rerunning with the same `end_time` rewrites the same
+    timestamps, so an interrupted run can be resumed without duplicating points.
+    """
+    n_buildings = n_buildings or settings.CAMPUS_BUILDINGS
+    buildings = [f"building_{i}" for i in range(1, n_buildings + 1)]
+    data_types = DATA_TYPES
+    rng = np.random.default_rng(seed)
+
+    end_time = end_time or datetime.utcnow()
+    start_time = end_time - timedelta(days=days)
+    step = np.timedelta64(int(resolution_minutes * 60), "s")
+    timestamps = np.arange(np.datetime64(start_time, "s"), np.datetime64(end_time, "s"), step)
+
+    per_step = n_buildings * len(data_types)
+    total_points = len(timestamps) * per_step
+    steps_per_chunk = max(1, chunk_points // per_step)
+    prefixes = sensor_line_prefixes(buildings, data_types)
+
+    logger.info(
+        f"Seeding {total_points} points ({len(timestamps)} steps x {n_buildings} buildings x "
+        f"{len(data_types)} types) with {workers} writers"
+    )
+
+    write_chunk(marker_line(end_time, days, resolution_minutes, completed=False), max_retries, retry_base_delay)
+
+    started = time.perf_counter()
+    written = 0
+    last_logged_pct = 0
+    pending = {}
+
+    def _collect(done):
+        nonlocal written, last_logged_pct
+        for future in done:
+            written += pending.pop(future)
+            future.result()
+            if progress:
+                progress(written, total_points)
+            pct = written * 100 // total_points
+            if pct >= last_logged_pct + 10:
+                last_logged_pct = pct - pct % 10
+                logger.info(f"Seeding progress: {written}/{total_points} points ({pct}%)")
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="seeder") as pool:
+        for offset in range(0, len(timestamps), steps_per_chunk):
+            block_ts = timestamps[offset:offset + steps_per_chunk]
+            values = generate_block(rng, block_ts, n_buildings, data_types)
+            body = format_block(prefixes, block_ts, values)
+
+            # Keep at most two chunks per writer in memory
+            if len(pending) >= workers * 2:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                _collect(done)
+
+            pending[pool.submit(write_chunk, body, max_retries, retry_base_delay)] = values.size
+
+        _collect(list(pending))
+
+    write_chunk(marker_line(end_time, days, resolution_minutes, completed=True), max_retries, retry_base_delay)
+
+    elapsed = time.perf_counter() - started
+    summary = {
+        "points": written,
+        "buildings": n_buildings,
+        "steps": len(timestamps),
+        "seconds": round(elapsed, 2),
+        "points_per_second": round(written / elapsed) if elapsed > 0 else written,
+    }
+    logger.info(f"Seeded {written} points in {elapsed:.1f}s ({summary['points_per_second']} points/s)")
+    return summary
+
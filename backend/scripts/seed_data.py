@@ -0,0 +1,38 @@
+# seed_data.py
+import argparse
+from datetime import datetime
+from app.core.config import settings
+from app.db.influx_client import init_influxdb, close_influxdb
+from app.simulation.seeder import seed_history
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk-load synthetic campus history into InfluxDB")
+    parser.add_argument("--days", type=float, default=settings.SEED_DAYS, help="Span of history to generate")
+    parser.add_argument("--resolution", type=int, default=settings.SEED_RESOLUTION_MINUTES, help="Minutes between readings")
+    parser.add_argument("--buildings", type=int, default=settings.SEED_BUILDINGS or settings.CAMPUS_BUILDINGS, help="Number of buildings")
+    parser.add_argument("--seed", type=int, default=settings.SEED_RANDOM_SEED, help="Random seed for reproducible data")
+    parser.add_argument("--chunk-points", type=int, default=settings.SEED_CHUNK_POINTS, help="Points per write request")
+    parser.add_argument("--workers", type=int, default=settings.SEED_WORKERS, help="Parallel write requests")
+    args = parser.parse_args()
+    if 0 < settings.RAW_RETENTION_DAYS < args.days:
+        parser.error(f"--days {args.days:g} exceeds RAW_RETENTION_DAYS ({settings.RAW_RETENTION_DAYS}); older points would expire on write")
+
+    init_influxdb()
+    try:
+        summary = seed_history(
+            days=args.days,
+            resolution_minutes=args.resolution,
+            n_buildings=args.buildings,
+            seed=args.seed,
+            chunk_points=args.chunk_points,
+            workers=args.workers,
+            progress=lambda written, total: print(f"\r[{datetime.now():%H:%M:%S}] {written}/{total} points", end="", flush=True),
+        )
+        print()
+        print(f"Seeded {summary['points']} points in {summary['seconds']}s ({summary['points_per_second']} points/s)")
+    finally:
+        close_influxdb()
+
+# Allow manual execution from terminal: python -m scripts.seed_data --days 90 --buildings 1000
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,394 @@
+# ws_loadtest.py
+"""Load test for the real-time WebSocket endpoint.
+
+The real-time stack (broadcaster, topics, deltas, fan-out, producer, simulator tick) runs in
+a child process under uvicorn, with an in-memory stand-in for InfluxDB behind the normal
+buffered writer. The parent ramps up concurrent clients in steps. At each step it drives
+subscribe and request_update traffic and measures:
+- connect time (handshake until initial_data arrives)
+- fan-out latency (publish timestamp in each delta until it is received)
+- delivery ratio
+- server memory per connection
+- server-side queue/eviction counters
+
+The first step that misses the latency budget, drops deliveries or fails connections is
+reported as the saturation point. The report is JSON.
+
+Example: python -m scripts.ws_loadtest --steps 500,1000,2000,4000 --duration 20 --output ws_report.json
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing as mp
+import os
+import random
+import resource
+import socket
+import sys
+import time
+import urllib.request
+from collections import defaultdict
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+import numpy as np
+
+
+class _Record:
+    def __init__(self, values: Dict[str, Any]):
+        self.values = values
+
+    def get_value(self):
+        return self.values["_value"]
+
+
+class _Table:
+    def __init__(self, records: List[_Record]):
+        self.records = records
+
+
+class MemoryInflux:
+    """In-memory stand-in for InfluxDB: keeps the latest value of every (building, type) series.
+
+    `write` is used as the BufferedWriter's write function. `query` answers any Flux query
+    with one table per series. That matches what get_building_stats reads, which is the
+    only query the real-time endpoint issues.
+    """
+
+    def __init__(self):
+        self.latest: Dict[tuple, float] = {}
+        self.points = 0
+
+    def write(self, records: List[str]):
+        for line in records:
+            series, fields = line.split(" ", 2)[:2]
+            tags = dict(part.split("=", 1) for part in series.split(",")[1:])
+            self.latest[(tags["building"], tags["type"])] = float(fields.split("=", 1)[1])
+        self.points += len(records)
+
+    def query(self, query: str, org: str = None):
+        return [
+            _Table([_Record({"building": building, "type": data_type, "_value": value})])
+            for (building, data_type), value in list(self.latest.items())
+        ]
+
+
+def _raise_fd_limit():
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft < hard:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+
+
+def _rss_bytes(pid: Optional[int]) -> Optional[int]:
+    """Resident memory of the server, or None when its pid is unknown or not readable here"""
+    if pid is None:
+        return None
+    try:
+        with open(f"/proc/{pid}/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        return None
+
+
+def _mb(size: Optional[int]) -> Optional[float]:
+    return round(size / 2**20, 2) if size is not None else None
+
+
+def serve(port: int, tick_interval: float):
+    """Child process: the real-time endpoint, backed by MemoryInflux"""
+    _raise_fd_limit()
+    import uvicorn
+    from fastapi import FastAPI
+    from app.core.config import settings
+    from app.db import influx_client
+    from app.db.write_buffer import BufferedWriter
+
+    store = MemoryInflux()
+    influx_client.query_api = store
+    influx_client.writer = BufferedWriter(
+        write_fn=store.write,
+        batch_size=settings.WRITE_BATCH_SIZE,
+        flush_interval=settings.WRITE_FLUSH_INTERVAL,
+        max_queue_size=settings.WRITE_QUEUE_MAX_SIZE,
+        max_retries=0,
+        retry_base_delay=0,
+        backpressure_timeout=settings.WRITE_BACKPRESSURE_TIMEOUT,
+        on_batch_written=influx_client._notify_write_listeners,
+    )
+    influx_client.writer.start()
+
+    from app.api.endpoints import websocket
+    from app.simulation.data_generator import data_generator
+
+    # One full campus tick up front so the stats stand-in has data to serve
+    data_generator.run_matrix_tick(anomaly_probability=0.0)
+    influx_client.writer.flush()
+
+    async def ticker():
+        while True:
+            await asyncio.sleep(tick_interval)
+            data_generator.run_matrix_tick(anomaly_probability=0.0)
+
+    @asynccontextmanager
+    async def lifespan(app: FastAPI):
+        await websocket.start_realtime()
+        tasks = [asyncio.create_task(websocket.run_producer()), asyncio.create_task(ticker())]
+        yield
+        for task in tasks:
+            task.cancel()
+        await websocket.stop_realtime()
+
+    app = FastAPI(lifespan=lifespan)
+    app.include_router(websocket.router, prefix=f"{settings.API_V1_STR}/ws")
+    uvicorn.run(app, host="127.0.0.1", port=port, log_level="warning", backlog=4096)
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _get_json(url: str) -> Dict[str, Any]:
+    with urllib.request.urlopen(url, timeout=10) as response:
+        return json.loads(response.read())
+
+
+def _percentiles(samples: List[float]) -> Dict[str, Any]:
+    if not samples:
+        return {"count": 0, "p50": None, "p95": None, "p99": None, "max": None}
+    values = np.array(samples) * 1000
+    p50, p95, p99 = np.round(np.percentile(values, [50, 95, 99]), 3).tolist()
+    return {"count": len(samples), "p50": p50, "p95": p95, "p99": p99, "max": round(float(values.max()), 3)}
+
+
+class Metrics:
+    """Client-side measurements of the current step"""
+
+    def __init__(self):
+        self.reset()
+        self.connect_times: List[float] = []
+        self.connect_failures = 0
+        self.disconnects = 0
+
+    def reset(self):
+        self.recording = False
+        self.fanout: List[float] = []
+        self.deltas = 0
+        self.responses: Dict[str, int] = defaultdict(int)
+
+
+async def run_client(uri: str, metrics: Metrics, rng: random.Random, args, ready: asyncio.Event):
+    import websockets
+
+    started = time.perf_counter()
+    handshaken = False
+    try:
+        async with websockets.connect(uri, max_size=None, open_timeout=args.connect_timeout, ping_interval=None) as ws:
+            json.loads(await asyncio.wait_for(ws.recv(), args.connect_timeout))  # initial_data
+            metrics.connect_times.append(time.perf_counter() - started)
+            handshaken = True
+            ready.set()
+
+            if rng.random() < args.subscribe_ratio:
+                types = rng.sample(["energy", "water", "co2", "occupancy"], rng.randint(1, 4))
+                await ws.send(json.dumps({
+                    "type": "subscribe",
+                    "building_id": f"building_{rng.randint(1, args.buildings)}",
+                    "data_types": types,
+                }))
+
+            updater = asyncio.create_task(_request_updates(ws, rng, args)) if args.update_interval > 0 else None
+            try:
+                async for raw in ws:
+                    received = time.time()
+                    message = json.loads(raw)
+                    if not metrics.recording:
+                        continue
+                    metrics.responses[message["type"]] += 1
+                    if message["type"] == "delta":
+                        metrics.deltas += 1
+                        published = datetime.fromisoformat(message["data"]["timestamp"]).replace(tzinfo=timezone.utc)
+                        metrics.fanout.append(received - published.timestamp())
+            finally:
+                if updater:
+                    updater.cancel()
+        metrics.disconnects += 1
+    except asyncio.CancelledError:
+        raise
+    except Exception:
+        if handshaken:
+            metrics.disconnects += 1
+        else:
+            metrics.connect_failures += 1
+    finally:
+        ready.set()
+
+
+async def _request_updates(ws, rng: random.Random, args):
+    while True:
+        # Spread requests out so clients do not fire in lockstep
+        await asyncio.sleep(args.update_interval * rng.uniform(0.5, 1.5))
+        await ws.send(json.dumps({"type": "request_update"}))
+
+
+async def run_load(args, base_url: str, server_pid: Optional[int]) -> Dict[str, Any]:
+    uri = f"ws://{base_url}/api/v1/ws/real-time"
+    metrics_url = f"http://{base_url}/api/v1/ws/metrics"
+    rng = random.Random(args.seed)
+    metrics = Metrics()
+    clients: List[asyncio.Task] = []
+    connect_slots = asyncio.Semaphore(args.connect_concurrency)
+
+    async def connect_one():
+        async with connect_slots:
+            ready = asyncio.Event()
+            clients.append(asyncio.create_task(run_client(uri, metrics, random.Random(rng.random()), args, ready)))
+            # Hold the slot until the handshake finished or failed
+            await ready.wait()
+
+    baseline_rss = _rss_bytes(server_pid)
+    steps = []
+    saturation = None
+
+    for target in args.steps:
+        metrics.connect_times = []
+        failures_before = metrics.connect_failures
+        connect_started = time.perf_counter()
+        await asyncio.gather(*(connect_one() for _ in range(target - len(clients))))
+        connect_seconds = time.perf_counter() - connect_started
+
+        server_before = await asyncio.to_thread(_get_json, metrics_url)
+        metrics.reset()
+        metrics.recording = True
+        await asyncio.sleep(args.duration)
+        metrics.recording = False
+        server_after = await asyncio.to_thread(_get_json, metrics_url)
+
+        connected = server_after["connections"]
+        published = server_after["seq"] - server_before["seq"]
+        expected = published * connected
+        delivered = metrics.deltas / expected if expected else None
+        rss = _rss_bytes(server_pid)
+        fanout = _percentiles(metrics.fanout)
+        failures = metrics.connect_failures - failures_before
+        evictions = server_after["evictions"] - server_before["evictions"]
+
+        step = {
+            "clients": target,
+            "connected": connected,
+            "connect_seconds": round(connect_seconds, 3),
+            "connect_ms": _percentiles(metrics.connect_times),
+            "connect_failures": failures,
+            "fanout_ms": fanout,
+            "server_fanout_ms": server_after["fanout_latency"],
+            "deltas_published": published,
+            "delivery_ratio": round(delivered, 4) if delivered is not None else None,
+            "responses": dict(metrics.responses),
+            "evictions": evictions,
+            # Memory figures are null when the server's pid is unknown (--url without --server-pid)
+            "server_rss_mb": _mb(rss),
+            "memory_per_connection_kb": (
+                round((rss - baseline_rss) / max(connected, 1) / 1024, 2)
+                if rss is not None and baseline_rss is not None else None
+            ),
+        }
+        steps.append(step)
+        print(
+            f"{target:>6} clients | connect p95 {step['connect_ms']['p95']} ms | fan-out p99 {fanout['p99']} ms | "
+            f"delivered {step['delivery_ratio']} | {step['memory_per_connection_kb']} KB/conn",
+            file=sys.stderr,
+        )
+
+        reasons = []
+        if fanout["p99"] is not None and fanout["p99"] > args.latency_budget_ms:
+            reasons.append(f"fan-out p99 {fanout['p99']} ms over {args.latency_budget_ms} ms budget")
+        if delivered is not None and delivered < args.min_delivery:
+            reasons.append(f"delivery ratio {delivered:.4f} under {args.min_delivery}")
+        if failures > target * 0.01:
+            reasons.append(f"{failures} failed connects")
+        if evictions:
+            reasons.append(f"{evictions} slow clients evicted")
+        if reasons:
+            saturation = {"clients": target, "reasons": reasons}
+            if not args.keep_going:
+                break
+
+    for task in clients:
+        task.cancel()
+    await asyncio.gather(*clients, return_exceptions=True)
+
+    return {
+        "steps": steps,
+        "saturation": saturation,
+        "baseline_server_rss_mb": _mb(baseline_rss),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test the real-time WebSocket endpoint")
+    parser.add_argument("--steps", default="250,500,1000,2000,4000", help="Comma-separated concurrent client counts")
+    parser.add_argument("--duration", type=float, default=15.0, help="Seconds measured at each step")
+    parser.add_argument("--tick-interval", type=float, default=1.0, help="Seconds between simulated campus ticks")
+    parser.add_argument("--subscribe-ratio", type=float, default=0.5, help="Share of clients subscribing to one building")
+    parser.add_argument("--update-interval", type=float, default=10.0, help="Mean seconds between request_update per client; 0 disables")
+    parser.add_argument("--connect-concurrency", type=int, default=200, help="Handshakes in flight at once")
+    parser.add_argument("--connect-timeout", type=float, default=10.0)
+    parser.add_argument("--latency-budget-ms", type=float, help="Fan-out p99 above this marks saturation (default: WS_FANOUT_P99_TARGET_MS)")
+    parser.add_argument("--min-delivery", type=float, default=0.99, help="Delivery ratio below this marks saturation")
+    parser.add_argument("--keep-going", action="store_true", help="Run every step even after saturation")
+    parser.add_argument("--url", help="host:port of a running server instead of starting one (memory figures need a local pid)")
+    parser.add_argument("--server-pid", type=int, help="pid of the server given by --url, for memory figures")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write the JSON report here instead of stdout")
+    args = parser.parse_args()
+    args.steps = sorted(int(step) for step in args.steps.split(","))
+
+    from app.core.config import settings
+    args.buildings = settings.CAMPUS_BUILDINGS
+    if args.latency_budget_ms is None:
+        args.latency_budget_ms = settings.WS_FANOUT_P99_TARGET_MS
+
+    _raise_fd_limit()
+    server = None
+    if args.url:
+        base_url, server_pid = args.url, args.server_pid
+    else:
+        port = _free_port()
+        server = mp.get_context("spawn").Process(target=serve, args=(port, args.tick_interval), daemon=True)
+        server.start()
+        base_url, server_pid = f"127.0.0.1:{port}", server.pid
+        deadline = time.time() + 60
+        while True:
+            try:
+                _get_json(f"http://{base_url}/api/v1/ws/metrics")
+                break
+            except Exception:
+                if time.time() > deadline or not server.is_alive():
+                    raise SystemExit("Load-test server did not start")
+                time.sleep(0.2)
+
+    try:
+        results = asyncio.run(run_load(args, base_url, server_pid))
+    finally:
+        if server:
+            server.terminate()
+            server.join(10)
+
+    report = {
+        "generated_at": datetime.now(timezone.utc).isoformat(),
+        "config": {key: value for key, value in vars(args).items() if key not in ("output",)},
+        **results,
+    }
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text)
+        print(f"Report written to {args.output}", file=sys.stderr)
+    else:
+        print(text)
+
+
+# Allow manual execution from terminal: python -m scripts.ws_loadtest --steps 500,1000,2000
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.ensemble import IsolationForest, RandomForestClassifier, RandomForestRegressor
+
+from app.ml.compiled_forest import CompiledForest, compile_model, probe_inputs
+
+FEATURES = ["hour", "day_of_week", "temperature", "occupancy"]
+
+
+@pytest.fixture(scope="module")
+def data():
+    rng = np.random.default_rng(42)
+    X = pd.DataFrame(rng.normal(size=(600, len(FEATURES))) * [6, 2, 8, 40] + [12, 3, 20, 100], columns=FEATURES)
+    y = 3 * X["temperature"] + 0.5 * X["occupancy"] + rng.normal(size=len(X))
+    return X, y
+
+
+@pytest.fixture(scope="module")
+def rows(data):
+    X, _ = data
+    rng = np.random.default_rng(7)
+    sample = X.sample(200, random_state=0).to_numpy()
+    with_missing = sample.copy()
+    with_missing[rng.random(sample.shape) < 0.3] = np.nan
+    return pd.DataFrame(np.vstack([sample, with_missing]), columns=FEATURES)
+
+
+def assert_compiled(estimator):
+    compiled = compile_model(estimator)
+    assert isinstance(compiled, CompiledForest)
+    return compiled
+
+
+def test_regressor_matches_sklearn(data, rows):
+    X, y = data
+    model = RandomForestRegressor(n_estimators=25, max_depth=10, random_state=0).fit(X, y)
+    compiled = assert_compiled(model)
+    np.testing.assert_allclose(compiled.predict(rows), model.predict(rows), rtol=1e-9)
+
+
+def test_classifier_matches_sklearn(data, rows):
+    X, y = data
+    labels = np.digitize(y, np.quantile(y, [0.33, 0.66]))
+    model = RandomForestClassifier(n_estimators=25, random_state=0).fit(X, labels)
+    compiled = assert_compiled(model)
+    np.testing.assert_allclose(compiled.predict_proba(rows), model.predict_proba(rows), rtol=1e-9)
+    np.testing.assert_array_equal(compiled.predict(rows), model.predict(rows))
+
+
+def test_isolation_forest_matches_sklearn(data, rows):
+    X, _ = data
+    model = IsolationForest(n_estimators=50, contamination=0.05, random_state=0).fit(X)
+    compiled = assert_compiled(model)
+    np.testing.assert_allclose(compiled.score_samples(rows), model.score_samples(rows), rtol=1e-9)
+    np.testing.assert_array_equal(compiled.predict(rows), model.predict(rows))
+
+
+def test_missing_values_follow_sklearn_routing(data):
+    X, y = data
+    model = RandomForestRegressor(n_estimators=10, random_state=0).fit(X, y)
+    compiled = assert_compiled(model)
+    row = X.iloc[:1].copy()
+    row["temperature"] = np.nan
+    np.testing.assert_allclose(compiled.predict(row), model.predict(row), rtol=1e-9)
+
+
+def test_probe_inputs_cover_missing_values(data):
+    X, y = data
+    compiled = assert_compiled(RandomForestRegressor(n_estimators=5, random_state=0).fit(X, y))
+    assert np.isnan(probe_inputs(compiled)).any()
+
+
+def test_save_and_load_round_trip(tmp_path, data, rows):
+    X, y = data
+    model = RandomForestRegressor(n_estimators=10, random_state=0).fit(X, y)
+    assert_compiled(model).save(str(tmp_path / "forest"))
+    loaded = CompiledForest.load(str(tmp_path / "forest"))
+    np.testing.assert_allclose(loaded.predict(rows), model.predict(rows), rtol=1e-9)
+
+
+def test_unsupported_estimators_are_returned_unchanged(data):
+    from sklearn.linear_model import LinearRegression
+
+    X, y = data
+    model = LinearRegression().fit(X, y)
+    assert compile_model(model) is model
+    assert compile_model(None) is None
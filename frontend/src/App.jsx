@@ -9,6 +9,7 @@ import Leaderboard from './components/Dashboard/Leaderboard'
 import MetricsPanel from './components/Dashboard/MetricsPanel'
 import { dataAPI } from './services/api'
 import webSocketService from './services/websocket'
+import campusEventsService from './services/events'
 import { STATUS_COLORS, DATA_TYPES } from './utils/constants'
 import WhatIfSimulator from './components/WhatIfSimulator'
 import AnomalyAlerts from './components/AnomalyAlerts'
@@ -36,16 +37,17 @@ function App() {
     // Initialize WebSocket connection
     webSocketService.connect()
     
-    // Subscribe to WebSocket updates
-    const unsubscribe = webSocketService.subscribe('stats_update', (data) => {
-      const buildings = Object.values(data.buildings || {})
+    // Live campus stats are pushed over Server-Sent Events instead of polled
+    campusEventsService.connect()
+    const unsubscribe = campusEventsService.subscribe('buildings', (data) => {
+      const buildings = Object.values(data || {})
+      if (buildings.length === 0) return
       setStats(buildings)
       calculateCampusMetrics(buildings)
-      setConnected(true)
     })
     
     // Subscribe to connection status
-    webSocketService.subscribe('connection', (data) => {
+    campusEventsService.subscribe('connection', (data) => {
       setConnected(data.status === 'connected')
     })
     
@@ -59,6 +61,7 @@ function App() {
     
     return () => {
       unsubscribe()
+      campusEventsService.disconnect()
       webSocketService.disconnect()
     }
   }, [])
@@ -0,0 +1,95 @@
+import { API_ENDPOINTS } from '../utils/constants';
+
+// Read-only live campus feed over Server-Sent Events. EventSource reconnects on its own
+// and sends Last-Event-ID, so the server replays whatever was missed.
+class CampusEventsService {
+  constructor() {
+    this.source = null;
+    this.listeners = new Map();
+    this.buildings = {};
+    this.seq = null;
+  }
+
+  connect() {
+    if (this.source) {
+      return;
+    }
+    this.open();
+  }
+
+  open() {
+    this.source = new EventSource(`${API_ENDPOINTS.BASE}${API_ENDPOINTS.EVENTS}`);
+
+    this.source.addEventListener('snapshot', (event) => {
+      const { seq, buildings } = JSON.parse(event.data);
+      this.seq = seq;
+      this.buildings = buildings;
+      this.notifyListeners('buildings', this.buildings);
+    });
+
+    this.source.addEventListener('delta', (event) => {
+      const { seq, changes } = JSON.parse(event.data);
+      if (this.seq === null || seq !== this.seq + 1) {
+        // Missed a delta: start a fresh stream, which begins with a snapshot
+        this.reconnect();
+        return;
+      }
+      this.seq = seq;
+      const buildings = { ...this.buildings };
+      Object.entries(changes).forEach(([buildingId, fields]) => {
+        buildings[buildingId] = { ...buildings[buildingId], ...fields };
+      });
+      this.buildings = buildings;
+      this.notifyListeners('buildings', this.buildings);
+    });
+
+    this.source.addEventListener('anomaly', (event) => {
+      this.notifyListeners('anomaly', JSON.parse(event.data));
+    });
+
+    this.source.onopen = () => this.notifyListeners('connection', { status: 'connected' });
+    this.source.onerror = () => this.notifyListeners('connection', { status: 'disconnected' });
+  }
+
+  subscribe(type, callback) {
+    if (!this.listeners.has(type)) {
+      this.listeners.set(type, new Set());
+    }
+    this.listeners.get(type).add(callback);
+
+    // Return unsubscribe function
+    return () => {
+      if (this.listeners.has(type)) {
+        this.listeners.get(type).delete(callback);
+      }
+    };
+  }
+
+  notifyListeners(type, data) {
+    if (this.listeners.has(type)) {
+      this.listeners.get(type).forEach(callback => callback(data));
+    }
+  }
+
+  reconnect() {
+    this.source.close();
+    this.seq = null;
+    // A new EventSource carries no Last-Event-ID, so the server sends a snapshot first
+    this.open();
+  }
+
+  disconnect() {
+    if (this.source) {
+      this.source.close();
+      this.source = null;
+      this.seq = null;
+      this.listeners.clear();
+    }
+  }
+}
+
+// Create singleton instance
+const campusEventsService = new CampusEventsService();
+
+export { CampusEventsService };
+export default campusEventsService;
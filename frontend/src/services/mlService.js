@@ -353,23 +353,30 @@ class MLService {
     }
   }
 
-  // Batch predictions for multiple buildings
+  // Batch predictions for multiple buildings, served by one /predict/batch call
   async batchPredict(buildingIds, dataType = 'energy', hoursAhead = 24) {
-    const predictions = []
-    
-    for (const buildingId of buildingIds) {
-      try {
-        const prediction = await this.makePrediction(buildingId, dataType, hoursAhead)
-        predictions.push({
-          building_id: buildingId,
-          prediction: prediction
-        })
-      } catch (error) {
-        console.error(`Batch prediction failed for ${buildingId}:`, error)
-      }
+    try {
+      const response = await api.post(`${this.baseURL}/predict/batch`, {
+        building_ids: buildingIds,
+        data_types: [dataType],
+        hours_ahead: hoursAhead
+      })
+      const series = response.series[dataType]
+      const chartData = response.times.map((time, i) => ({
+        time: `${time.slice(11, 13)}:00`,
+        predicted: series.predicted[i],
+        baseline: series.baseline
+      }))
+
+      // The forecast is the same for every building
+      return response.buildings.map(buildingId => ({
+        building_id: buildingId,
+        prediction: { building_id: buildingId, data_type: dataType, chart_data: chartData }
+      }))
+    } catch (error) {
+      console.error('Batch prediction failed:', error)
+      return []
     }
-    
-    return predictions
   }
 
   // Calculate sustainability score based on predictions
@@ -8,6 +8,9 @@ class WebSocketService {
     this.reconnectDelay = 3000;
     this.listeners = new Map();
     this.isConnected = false;
+    // Campus state rebuilt from snapshots and sequenced deltas
+    this.buildings = {};
+    this.lastSeq = null;
   }
 
   connect() {
@@ -45,6 +48,7 @@ class WebSocketService {
     this.socket.onclose = (event) => {
       console.log('WebSocket disconnected:', event.code, event.reason);
       this.isConnected = false;
+      this.lastSeq = null;
       this.notifyListeners('connection', { status: 'disconnected' });
       this.handleReconnect();
     };
@@ -56,6 +60,14 @@ class WebSocketService {
   }
 
   handleMessage(data) {
+    if (data.type === 'initial_data' || data.type === 'snapshot') {
+      this.buildings = data.data.buildings;
+      this.lastSeq = data.data.seq;
+      this.notifyListeners('buildings', this.buildings);
+    } else if (data.type === 'delta') {
+      this.applyDelta(data.data);
+    }
+
     // Notify type-specific listeners
     if (data.type && this.listeners.has(data.type)) {
       const callbacks = this.listeners.get(data.type);
@@ -69,6 +81,27 @@ class WebSocketService {
     }
   }
 
+  applyDelta({ seq, changes }) {
+    // Not synced yet, or an update we already have through a snapshot
+    if (this.lastSeq === null || seq <= this.lastSeq) {
+      return;
+    }
+    if (seq !== this.lastSeq + 1) {
+      // Missed an update: drop the stale state and ask for a full snapshot
+      this.lastSeq = null;
+      this.send({ type: 'request_snapshot' });
+      return;
+    }
+
+    const buildings = { ...this.buildings };
+    Object.entries(changes).forEach(([buildingId, fields]) => {
+      buildings[buildingId] = { ...buildings[buildingId], ...fields };
+    });
+    this.buildings = buildings;
+    this.lastSeq = seq;
+    this.notifyListeners('buildings', this.buildings);
+  }
+
   handleReconnect() {
     if (this.reconnectAttempts >= this.maxReconnectAttempts) {
       console.error('Max reconnection attempts reached');
@@ -74,6 +74,7 @@ export const API_ENDPOINTS = {
     SIMULATION_STATUS: '/data/simulation/status',
     TOGGLE_SIMULATION:  '/data/simulation/toggle'
   },
+  EVENTS: '/events/stream',
   WS: `${import.meta.env.VITE_WS_URL}`
 };
 